@@ -1,30 +1,125 @@
 import typer
 import xgboost
+from typing import List
 app = typer.Typer()
 
 
+def _load_ohlcv(symbol: str, currency: str, cache=None):
+    from crawlers import kraken
+    ohlcv = kraken.get_bootstrap_ohlcv(symbol, currency, intervals=['1D'], cache=cache)['1D']
+    return ohlcv.fillna(method='ffill')
+
+
+def _read_csv_tail(filename, rows=1):
+    # Read the header and the last rows of a csv file without parsing the whole file
+    import io
+    import os
+    import pandas as pd
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b''
+        while pos > len(header) and buf.count(b'\n') <= rows:
+            step = min(1 << 16, pos - len(header))
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+    lines = buf.splitlines(keepends=True)[-rows:]
+    return pd.read_csv(io.BytesIO(header + b''.join(lines)), parse_dates=True, index_col='timestamp')
+
+
+def _load_dataset(target_name, columns=None, begin=None, end=None):
+    # Prefer the columnar artifacts, csv files are only an export
+    import columnstore
+    import pandas as pd
+    if columnstore.exists(target_name + '.columns'):
+        return columnstore.load_columns(target_name + '.columns', columns=columns, begin=begin, end=end)
+    dataset = pd.read_csv(target_name + '.csv', parse_dates=True, index_col='timestamp', usecols=['timestamp'] + columns if columns else None)
+    return dataset.loc[begin:end]
+
+
+def _load_target(target_name, columns=None, begin=None, end=None):
+    import columnstore
+    import pandas as pd
+    if columnstore.exists(target_name + '.target.columns'):
+        return columnstore.load_columns(target_name + '.target.columns', columns=columns, begin=begin, end=end)
+    target = pd.read_csv(target_name + '.target.csv', parse_dates=True, index_col='timestamp', usecols=['timestamp'] + columns if columns else None)
+    return target.loc[begin:end]
+
+
+def _get_facet_cache():
+    from config import config
+    from util.cache import DiskCache
+    return DiskCache(config['cache']['path'].get(str), max_size=config['cache']['max_size'].get(int))
+
+
+def _load_stl_cache(target_name):
+    import os
+    import pickle
+    if not os.path.exists(target_name + '.stl.pkl'):
+        return {}
+    with open(target_name + '.stl.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+def _save_stl_cache(target_name, cache):
+    import pickle
+    with open(target_name + '.stl.pkl', 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
 @app.command(name='bootstrap', help='Bootstrap dataset with data from zip files in data/bootstrap')
-def build_dataset(symbol: str, currency: str):
+def build_dataset(symbol: str, currency: str,
+                  stl_mode: str = typer.Option('full', help='STL residuals: full, rolling or expanding (causal)'),
+                  stl_window: int = typer.Option(365, help='Records in each rolling STL fit'),
+                  horizons: List[int] = typer.Option([1], help='Target horizons in records, may be repeated'),
+                  executor: str = typer.Option('thread', help='Facet executor: thread, process or serial'),
+                  workers: int = typer.Option(None, help='Maximum number of facets built concurrently'),
+                  cache: bool = typer.Option(True, help='Reuse bootstrap conversions and facets computed by previous builds'),
+                  float32: bool = typer.Option(False, help='Store features as float32'),
+                  assembly: str = typer.Option('block', help='Join feature groups into a preallocated block or with concat'),
+                  csv: bool = typer.Option(False, help='Also export dataset and target as csv'),
+                  store: bool = typer.Option(False, help='Also save feature groups to the featurestore')):
     target_name = '../data/dataset-{symbol}{currency}'.format(symbol=symbol, currency=currency)
-    from crawlers import kraken, coinmetrics
-    _kraken = kraken.get_bootstrap_data(symbol, currency).fillna(method='ffill')
-    _coinmetrics = coinmetrics.get_bootstrap_data(symbol)
-
-    ohlcv = kraken.ticks_to_ohlcv(_kraken, '1D').fillna(method='ffill')
+    import columnstore
+    from crawlers import coinmetrics, get_conversion_cache
+    conversion_cache = get_conversion_cache() if cache else None
+    _coinmetrics = coinmetrics.get_bootstrap_data(symbol, cache=conversion_cache)
+    ohlcv = _load_ohlcv(symbol, currency, cache=conversion_cache)
 
-    from dataset import build, get_feature_metadata, make_target
+    from dataset import build_groups, assemble, profile_features, get_valid_range, make_target
+    from util.scheduler import peak_rss
     import pandas as pd
-    result = build(ohlcv=ohlcv, coinmetrics=_coinmetrics, W=10)
-    result.to_csv(target_name + '.csv', index_label='timestamp')
+    parameters = {'W': 10, 'spline_window': 30, 'stl_mode': stl_mode, 'stl_window': stl_window}
+    stl_cache = _load_stl_cache(target_name)
+    groups = build_groups(ohlcv=ohlcv, coinmetrics=_coinmetrics, stl_cache=stl_cache,
+                          executor=executor if executor != 'serial' else None, workers=workers,
+                          cache=_get_facet_cache() if cache else None, float32=float32, **parameters)
+    if stl_mode != 'full':
+        _save_stl_cache(target_name, stl_cache)
+    if store:
+        import featurestore
+        featurestore.save_groups('dataset_{symbol}{currency}'.format(symbol=symbol, currency=currency), groups, mode='replace')
+    if assembly == 'block':
+        result = assemble(groups, dtype='float32' if float32 else None)
+    else:
+        result = pd.concat(list(groups.values()), axis='columns', verify_integrity=True, sort=True, join='outer')
+    del groups
+    if peak_rss() is not None:
+        print('Peak RSS after assembly: {:.0f}MB'.format(peak_rss()))
+    columnstore.save_columns(target_name + '.columns', result, dtype='float32' if float32 else None)
+    if csv:
+        result.to_csv(target_name + '.csv', index_label='timestamp')
 
-    _begin, _end, _features = get_feature_metadata(result)
-    meta = pd.DataFrame.from_records(_features)
-    meta.index = meta['name']
-    meta.drop(labels='name', axis='columns', inplace=True)
+    meta = profile_features(result)
+    _begin, _end = get_valid_range(meta)
     meta.to_csv(target_name + '.meta.csv', index_label='feature')
 
-    target = make_target(ohlcv)
-    target.to_csv(target_name + '.target.csv', index_label='timestamp')
+    target = make_target(ohlcv, periods=horizons)
+    columnstore.save_columns(target_name + '.target.columns', target)
+    if csv:
+        target.to_csv(target_name + '.target.csv', index_label='timestamp')
 
     info = {
         'symbol': symbol,
@@ -36,6 +131,9 @@ def build_dataset(symbol: str, currency: str):
         'index_max': result.index.max().to_pydatetime().isoformat(),
         'valid_index_min': _begin,
         'valid_index_max': _end,
+        'parameters': parameters,
+        'horizons': list(horizons),
+        'featurestore': store,
         'targets': {str(k): False if k != 'class' else True for k in target.columns},
         'features': {str(k): True for k in meta.index}
     }
@@ -44,47 +142,119 @@ def build_dataset(symbol: str, currency: str):
         yaml.dump(info, f, sort_keys=False)
     print('done')
 
+
+@app.command(name='update', help='Append records from bootstrap data newer than the dataset\'s last record. Full STL residuals are refit over the whole history')
+def update_dataset(symbol: str, currency: str,
+                   executor: str = typer.Option('thread', help='Facet executor: thread, process or serial'),
+                   workers: int = typer.Option(None, help='Maximum number of facets built concurrently'),
+                   cache: bool = typer.Option(True, help='Reuse bootstrap conversions and facets computed by previous builds')):
+    target_name = '../data/dataset-{symbol}{currency}'.format(symbol=symbol, currency=currency)
+    import os
+    import pandas as pd
+    import columnstore
+    from crawlers import load_yaml, coinmetrics, get_conversion_cache
+    from dataset import build_tail, update_feature_metadata, make_target
+
+    info = load_yaml(target_name + '.info.yaml')
+    parameters = info.get('parameters', {'W': 10})
+    since = pd.Timestamp(info.index_max)
+    conversion_cache = get_conversion_cache() if cache else None
+    _coinmetrics = coinmetrics.get_bootstrap_data(symbol, cache=conversion_cache)
+    ohlcv = _load_ohlcv(symbol, currency, cache=conversion_cache)
+    if ohlcv.index.max() <= since and _coinmetrics.index.max() <= since:
+        print('Dataset is up to date')
+        return
+
+    # Only the header and the last record of the existing dataset are read
+    has_columns = columnstore.exists(target_name + '.columns')
+    has_csv = os.path.exists(target_name + '.csv')
+    if has_columns:
+        anchor = columnstore.load_columns(target_name + '.columns', tail=1)
+    else:
+        anchor = _read_csv_tail(target_name + '.csv')
+    stl_cache = _load_stl_cache(target_name)
+    result = build_tail(ohlcv=ohlcv, coinmetrics=_coinmetrics, since=since, anchor=anchor.iloc[-1], stl_cache=stl_cache,
+                        executor=executor if executor != 'serial' else None, workers=workers,
+                        cache=_get_facet_cache() if cache else None, **parameters)
+    if parameters.get('stl_mode', 'full') != 'full':
+        _save_stl_cache(target_name, stl_cache)
+    result = result.reindex(columns=anchor.columns)
+    if has_columns:
+        columnstore.append_columns(target_name + '.columns', result)
+    if has_csv:
+        result.to_csv(target_name + '.csv', mode='a', header=False)
+    if info.get('featurestore'):
+        import featurestore
+        featurestore.save_grouped_df('dataset_{symbol}{currency}'.format(symbol=symbol, currency=currency), result)
+
+    meta = pd.read_csv(target_name + '.meta.csv', index_col='feature')
+    _begin, _end, meta = update_feature_metadata(meta, result)
+    meta.to_csv(target_name + '.meta.csv', index_label='feature')
+
+    # Targets are rebuilt entirely: binned classes use quantiles of the whole history
+    target = make_target(ohlcv, periods=info.get('horizons', [1]))
+    if columnstore.exists(target_name + '.target.columns'):
+        columnstore.save_columns(target_name + '.target.columns', target)
+    if os.path.exists(target_name + '.target.csv'):
+        target.to_csv(target_name + '.target.csv', index_label='timestamp')
+
+    dinfo = info.to_dict()
+    dinfo['records'] += result.shape[0]
+    dinfo['index_max'] = result.index.max().to_pydatetime().isoformat()
+    dinfo['valid_index_min'] = _begin
+    dinfo['valid_index_max'] = _end
+    with open(target_name + '.info.yaml', 'w') as f:
+        import yaml
+        yaml.dump(dinfo, f, sort_keys=False)
+    print('Appended {} records'.format(result.shape[0]))
+
 @app.command(name='selection', help='Perform feature selection and update <dataset>.info.yaml with selected features')
-def selection(symbol: str, currency: str, percent: float):
+def selection(symbol: str, currency: str, percent: float,
+              method: str = typer.Option('model', help='model (SelectFromModel on the training split), rfecv or permutation (walk-forward folds)'),
+              folds: int = typer.Option(5, help='Walk-forward folds of the training split (rfecv, permutation)'),
+              step: float = typer.Option(0.1, help='Features dropped by each rfecv round, a fraction of the remaining ones when < 1'),
+              workers: int = typer.Option(None, help='Processes fitting folds concurrently (rfecv, permutation)')):
     target_name = '../data/dataset-{symbol}{currency}'.format(symbol=symbol, currency=currency)
     import pandas as pd
     import math
     from crawlers import load_yaml, save_yaml
 
     info = load_yaml(target_name + '.info.yaml')
-    dataset = pd.read_csv(target_name + '.csv', parse_dates=True, index_col='timestamp')
-    target = pd.read_csv(target_name + '.target.csv', parse_dates=True, index_col='timestamp')
-    first_valid_i = dataset.index.get_loc(info.valid_index_min)
-    last_valid_i = dataset.index.get_loc(info.valid_index_max)
+    # Only records in the valid range are read
+    dataset = _load_dataset(target_name, begin=info.valid_index_min, end=info.valid_index_max)
+    target = _load_target(target_name, columns=['class'], begin=info.valid_index_min, end=info.valid_index_max)
 
-    training_records = math.floor((last_valid_i - first_valid_i) * percent)
+    training_records = math.floor((dataset.shape[0] - 1) * percent)
     dataset['label'] = target['class']
-    training_dataset = dataset.iloc[first_valid_i:first_valid_i+training_records]
-    # testing_dataset = dataset.iloc[first_valid_i+training_records: last_valid_i+1]
-
-    from xgboost import XGBClassifier
-    from util.selection_pipeline import Pipeline
-    from sklearn.impute import SimpleImputer
-    from sklearn.preprocessing import StandardScaler
-    pipeline = Pipeline(steps=[
-        ('s', StandardScaler()),
-        ('i', SimpleImputer()),
-        ('c', XGBClassifier(use_label_encoder=False))
-    ])
+    training_dataset = dataset.iloc[:training_records]
+    # testing_dataset = dataset.iloc[training_records:]
 
     X_train = training_dataset.drop(labels=['label'], axis='columns')
     with pd.option_context('mode.use_inf_as_na', True):  # Set option temporarily
         X_train.fillna(axis='columns', method='ffill', inplace=True)
     y_train = training_dataset['label']
 
-    from sklearn.feature_selection import SelectFromModel
-    sel = SelectFromModel(pipeline)
-    sel.fit(X_train, y_train)
-    support = sel.get_support()
+    report = None
+    if method == 'model':
+        from util.selection import make_pipeline
+        from sklearn.feature_selection import SelectFromModel
+        sel = SelectFromModel(make_pipeline())
+        sel.fit(X_train, y_train)
+        support = sel.get_support()
+    elif method in ('rfecv', 'permutation'):
+        from util.selection import select_features
+        support, report = select_features(X_train, y_train, method=method, n_splits=folds, step=step, workers=workers)
+        timings = pd.DataFrame(report.pop('timings'))
+        print(timings.to_string(index=False, float_format='{:.3f}'.format))
+        print('Fit time: {:.1f}s, score time: {:.1f}s'.format(timings.fit_time.sum(), timings.score_time.sum()))
+    else:
+        raise typer.BadParameter('Unknown selection method {}, use model, rfecv or permutation'.format(method))
 
     dinfo = info.to_dict()
     for c, mask in zip(X_train.columns, support):
         dinfo['features'][c] = True if mask else False
+    if report:
+        dinfo['selection'] = report
 
     import yaml
     with open(target_name + '.info.yaml', 'w') as f:
@@ -94,14 +264,62 @@ def selection(symbol: str, currency: str, percent: float):
     print('done')
 
 
+@app.command(name='export', help='Export dataset and target to csv files')
+def export(symbol: str, currency: str):
+    target_name = '../data/dataset-{symbol}{currency}'.format(symbol=symbol, currency=currency)
+    import columnstore
+    columnstore.export_csv(target_name + '.columns', target_name + '.csv')
+    columnstore.export_csv(target_name + '.target.columns', target_name + '.target.csv')
+    print('done')
+
+
+@app.command(name='crawl', help='Fetch records newer than the last crawl of each series into the featurestore')
+def crawl(source: str = typer.Argument(..., help='coinmetrics or kraken'),
+          asset: str = typer.Argument(..., help='Coinmetrics asset (eg. btc) or Kraken pair (eg. XBTUSD)'),
+          metrics: str = typer.Option(None, help='Comma separated coinmetrics metrics, all available when omitted'),
+          frequency: str = typer.Option('1d', help='Coinmetrics frequency'),
+          begin: str = typer.Option('2009-01-01', help='First timestamp of series never crawled before'),
+          interval: int = typer.Option(1440, help='Kraken interval in minutes')):
+    from crawlers import coinmetrics, kraken
+    if source == 'coinmetrics':
+        if not metrics:
+            metrics = [f['name'] for f in coinmetrics.get_asset_features(asset, frequency)]
+        written = coinmetrics.crawl_asset_metrics(asset, metrics, frequency, begin)
+    elif source == 'kraken':
+        written = kraken.crawl_pair_ohlc(asset, interval=interval)
+    else:
+        raise typer.BadParameter('Unknown source {}, use coinmetrics or kraken'.format(source))
+    print('Crawled {} records'.format(written))
+
+
+@app.command(name='cache', help='Warm the bootstrap conversion cache for a pair, or clear it')
+def cache_command(action: str = typer.Argument(..., help='warm or clear'),
+                  symbol: str = typer.Argument(None), currency: str = typer.Argument(None),
+                  facets: bool = typer.Option(False, help='When clearing, also clear the facet cache')):
+    from crawlers import coinmetrics, get_conversion_cache
+    conversion_cache = get_conversion_cache()
+    if action == 'warm':
+        if not symbol or not currency:
+            raise typer.BadParameter('warm needs a symbol and a currency')
+        coinmetrics.get_bootstrap_data(symbol, cache=conversion_cache)
+        _load_ohlcv(symbol, currency, cache=conversion_cache)
+    elif action == 'clear':
+        conversion_cache.clear()
+        if facets:
+            _get_facet_cache().clear()
+    else:
+        raise typer.BadParameter('Unknown action {}, use warm or clear'.format(action))
+    print('Conversion cache: {}'.format(conversion_cache.stats()))
+
 
 @app.command()
 def test(symbol: str, currency: str):
-    from dataset import make_ohlcv_ta
-    from crawlers import kraken
-    _kraken = kraken.get_bootstrap_data(symbol, currency).fillna(method='ffill')
-    ohlcv = kraken.ticks_to_ohlcv(_kraken, '1D').fillna(method='ffill')
-    ohlcv_ta = make_ohlcv_ta(ohlcv)
+    from crawlers import get_conversion_cache
+    from dataset import make_ohlcv_ta, TA_INDICATORS
+    ohlcv = _load_ohlcv(symbol, currency, cache=get_conversion_cache())
+    facet_cache = _get_facet_cache()
+    ohlcv_ta = facet_cache.call(make_ohlcv_ta, ohlcv, indicators=TA_INDICATORS)
+    print('Facet cache: {}'.format(facet_cache.stats()))
     print('It works')
     print(ohlcv_ta.head())
 
@@ -0,0 +1,136 @@
+import os
+import yaml
+import numpy as np
+import pandas as pd
+
+# Columnar on-disk format for dataset artifacts: a directory holding one raw binary file per
+# column plus the int64 timestamp index, described by schema.yaml. Files are memory mapped on
+# read, so loading a subset of columns or a timestamp range only touches the bytes it needs.
+SCHEMA_FILE = 'schema.yaml'
+INDEX_FILE = 'timestamp.bin'
+
+
+def _column_file(i):
+    # Column names may not be valid file names, files are named after the column's position
+    return 'c{:05d}.bin'.format(i)
+
+
+def exists(path):
+    return os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+
+def get_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE), 'r') as f:
+        return yaml.safe_load(f)
+
+
+def _save_schema(path, schema):
+    tmp = os.path.join(path, SCHEMA_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        yaml.safe_dump(schema, f, sort_keys=False)
+    os.replace(tmp, os.path.join(path, SCHEMA_FILE))
+
+
+def _index_values(index):
+    return pd.DatetimeIndex(index).asi8.astype(np.int64)
+
+
+def save_columns(path, df: pd.DataFrame, dtype=None):
+    """
+    Write df to path, replacing any previous content.
+    :param dtype: optional dtype for float columns, eg. 'float32' to halve the size of the dataset
+    """
+    os.makedirs(path, exist_ok=True)
+    columns = []
+    for i, c in enumerate(df.columns):
+        values = df[c].to_numpy()
+        if dtype and np.issubdtype(values.dtype, np.floating):
+            values = values.astype(dtype)
+        values.tofile(os.path.join(path, _column_file(i)))
+        columns.append({'name': str(c), 'file': _column_file(i), 'dtype': values.dtype.str})
+    _index_values(df.index).tofile(os.path.join(path, INDEX_FILE))
+    _save_schema(path, {'rows': int(df.shape[0]), 'index': df.index.name or 'timestamp', 'columns': columns})
+    # Column files of a wider previous content
+    files = {c['file'] for c in columns}
+    for f in os.listdir(path):
+        if f.startswith('c') and f.endswith('.bin') and f not in files:
+            os.remove(os.path.join(path, f))
+
+
+def _write_after(filename, rows, values):
+    # Write values after the first `rows` records, discarding the bytes an interrupted append left
+    # beyond them: the schema is only updated once all files are written
+    with open(filename, 'r+b') as f:
+        f.truncate(rows * values.dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(values.tobytes())
+
+
+def append_columns(path, df: pd.DataFrame):
+    """
+    Append records to path, columns missing from df are stored as NaN and extra columns are ignored.
+    """
+    schema = get_schema(path)
+    df = df.reindex(columns=[c['name'] for c in schema['columns']])
+    for c in schema['columns']:
+        _write_after(os.path.join(path, c['file']), schema['rows'], df[c['name']].to_numpy(dtype=np.dtype(c['dtype'])))
+    _write_after(os.path.join(path, INDEX_FILE), schema['rows'], _index_values(df.index))
+    schema['rows'] += int(df.shape[0])
+    _save_schema(path, schema)
+
+
+def _memmap(path, filename, dtype, rows):
+    if not rows:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(os.path.join(path, filename), dtype=dtype, mode='r', shape=(rows,))
+
+
+def get_column(path, name):
+    """Memory mapped values of a column, without copying them"""
+    schema = get_schema(path)
+    for c in schema['columns']:
+        if c['name'] == name:
+            return _memmap(path, c['file'], np.dtype(c['dtype']), schema['rows'])
+    raise ValueError('Column not found in {}: {}'.format(path, name))
+
+
+def load_columns(path, columns=None, begin=None, end=None, **kwargs):
+    """
+    Read records from path.
+    :param columns: list of columns to read, all columns when None
+    :param begin: first timestamp to read (inclusive)
+    :param end: last timestamp to read (inclusive)
+    :param tail: only read the last `tail` records of the range
+    :return: DataFrame indexed by timestamp
+    """
+    schema = get_schema(path)
+    rows = schema['rows']
+    timestamps = _memmap(path, INDEX_FILE, np.int64, rows)
+    lo = int(np.searchsorted(timestamps, pd.Timestamp(begin).value, side='left')) if begin is not None else 0
+    hi = int(np.searchsorted(timestamps, pd.Timestamp(end).value, side='right')) if end is not None else rows
+    if kwargs.get('tail'):
+        lo = max(lo, hi - kwargs.get('tail'))
+
+    return _read_range(path, schema, lo, hi, columns)
+
+
+def _read_range(path, schema, lo, hi, columns=None):
+    rows = schema['rows']
+    by_name = {c['name']: c for c in schema['columns']}
+    if columns is None:
+        columns = list(by_name.keys())
+    missing = [c for c in columns if c not in by_name]
+    if missing:
+        raise ValueError('Columns not found in {}: {}'.format(path, ', '.join(missing)))
+    data = {c: np.array(_memmap(path, by_name[c]['file'], np.dtype(by_name[c]['dtype']), rows)[lo:hi]) for c in columns}
+    timestamps = _memmap(path, INDEX_FILE, np.int64, rows)
+    index = pd.DatetimeIndex(np.array(timestamps[lo:hi]).view('datetime64[ns]'), name=schema['index'])
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def export_csv(path, filename, chunksize=10000):
+    """Export path to a csv file, a chunk of records at a time"""
+    schema = get_schema(path)
+    for i in range(0, max(schema['rows'], 1), chunksize):
+        chunk = _read_range(path, schema, i, min(i + chunksize, schema['rows']))
+        chunk.to_csv(filename, mode='w' if i == 0 else 'a', header=(i == 0), index_label=schema['index'])
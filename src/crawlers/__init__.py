@@ -1,4 +1,5 @@
 import yaml
+import functools
 from util.bunch import Bunch
 
 
@@ -16,7 +17,9 @@ class Spec(dict):
             raise ValueError('Provided spec is invalid.')
         if not 'base_url' in spec:
             raise ValueError('Provided spec does not describe a base url.')
-        res = Spec(base_url=spec['base_url'], endpoints=spec['endpoints'])
+        # Other keys, eg. rate_limit, are available as items
+        res = Spec(base_url=spec['base_url'], endpoints=spec['endpoints'],
+                   **{k: v for k, v in spec.items() if k not in ['base_url', 'endpoints']})
         return res
 
     def __dir__(self):
@@ -52,6 +55,16 @@ def load_api_spec(filename):
     if spec:
         return Spec.from_dict(spec)
 
+@functools.lru_cache(maxsize=None)
+def get_client(filename, base_url=None):
+    """
+    Shared crawlers.client.Client for the api spec in filename, so that all requests to an
+    API reuse its connections and rate limit.
+    :param base_url: optional override of the spec's base url, eg. to target a local stand-in server
+    """
+    from .client import Client
+    return Client(load_api_spec(filename), base_url=base_url)
+
 def load_yaml(filename):
     with open(filename, 'r') as f:
         try:
@@ -76,6 +89,39 @@ def load_bootstrap(zip_file, csv_file):
             train = pd.read_csv(f, delimiter=",", parse_dates=True, index_col='date')
             return train
 
+def map_concurrent(fun, items, workers=None):
+    """
+    Call fun(item) for each item from a pool of threads, eg. to decode several zip members whose
+    parsing releases the GIL. Results are yielded in the order of items as soon as each is ready.
+    :param workers: number of threads, defaults to one per item
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    items = list(items)
+    workers = workers or max(1, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fun, item) for item in items]
+        for future in futures:
+            yield future.result()
+
+def merge_aligned(frames):
+    """
+    Merge frames on the union of their indexes, columns found in several frames take the values
+    of the first frame having them and are filled from the following ones where missing.
+    """
+    import pandas as pd
+    result = None
+    for df in frames:
+        if result is None:
+            result = df
+            continue
+        shared = df.columns.intersection(result.columns)
+        if len(shared):
+            result = result.combine_first(df[shared])[result.columns]
+        new = df.columns.difference(result.columns, sort=False)
+        if len(new):
+            result = pd.concat([result, df[new]], axis=1)
+    return result.sort_index() if result is not None else None
+
 def bootstrap_index(filename):
     index = load_yaml(filename)
     return index.bootstrap
@@ -87,4 +133,51 @@ def load_transformer(filename):
     spec = importlib.util.spec_from_file_location("bootstrap."+ntpath.basename(filename)[:-3], filename)
     transformer = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(transformer)
-    return transformer
\ No newline at end of file
+    return transformer
+
+def _file_sha1(filename):
+    import hashlib
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def conversion_key(zip_file, member, transformer_file, *args):
+    """
+    Key of a frame converted from a zip member: changes when the zip file is replaced (path,
+    size and modification time) or the transformer's code changes.
+    :param args: any further parameter of the conversion, eg. the intervals of the bars
+    """
+    import os
+    import hashlib
+    st = os.stat(zip_file)
+    h = hashlib.sha1()
+    h.update(repr((os.path.abspath(zip_file), member, st.st_size, st.st_mtime_ns,
+                   _file_sha1(transformer_file), args)).encode())
+    return h.hexdigest()
+
+
+def get_conversion_cache():
+    """util.cache.DiskCache holding frames converted from bootstrap zip files, see config.yaml"""
+    from config import config
+    from util.cache import DiskCache
+    return DiskCache(config['cache']['bootstrap_path'].get(str), max_size=config['cache']['max_size'].get(int))
+
+
+def load_converted(zip_file, member, transformer_file, convert, params=(), cache=None):
+    """
+    Result of convert(), a conversion of a zip member by a transformer, loaded from cache
+    when the zip file and transformer are unchanged since it was stored.
+    :param params: parameters telling apart conversions of the same member, eg. ('ohlcv', intervals)
+    :param cache: DiskCache from get_conversion_cache, or None to always convert
+    """
+    if cache is None:
+        return convert()
+    key = conversion_key(zip_file, member, transformer_file, *params)
+    value = cache.get(key)
+    if value is None:
+        value = convert()
+        cache.put(key, value)
+    return value
@@ -0,0 +1,100 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: up to `burst` requests at once, refilled at `rate` requests per second.
+    """
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Client:
+    """
+    HTTP client for an API spec: pooled connections, a token bucket sized by the spec's
+    rate_limit ({rate: requests per second, burst: requests}) and retries with exponential backoff
+    on connection errors, 429 and 5xx responses.
+    Examples
+    --------
+    # >>> from crawlers import coinmetrics
+    # >>> client = Client(coinmetrics.api(), base_url='http://127.0.0.1:8000')  # eg. a local stand-in server
+    # >>> coinmetrics.get_asset_metrics('btc', ['PriceUSD'], '1d', '2020-01-01', '2020-12-31', client=client)
+    """
+    def __init__(self, spec, base_url=None, retries=5, backoff=0.5, timeout=30, pool_size=8):
+        from . import Spec
+        self.spec = Spec(base_url=base_url or spec.base_url, endpoints=spec.endpoints)
+        self.bucket = TokenBucket(**(spec.get('rate_limit') or {}))
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.requests = 0
+        self.retried = 0
+
+    def url(self, endpoint, **params):
+        url = getattr(self.spec, endpoint)
+        return url(**params) if params else url
+
+    def get_json(self, url):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            self.requests += 1
+            try:
+                resp = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                if resp.status_code != 429 and resp.status_code < 500:
+                    resp.raise_for_status()
+                    return resp.json()
+                if attempt == self.retries:
+                    resp.raise_for_status()
+                try:  # Honour the server's Retry-After when it sends one
+                    delay = float(resp.headers['Retry-After'])
+                except (KeyError, ValueError):
+                    delay = self.backoff * 2 ** attempt
+            self.retried += 1
+            time.sleep(delay)
+
+    def get_pages(self, url, next_page=lambda rj: rj.get('next_page_url')):
+        """
+        Iterate over the json pages of a paginated request.
+        :param next_page: function of a page returning the url of the next one, or None after the last
+        """
+        while url:
+            rj = self.get_json(url)
+            yield rj
+            url = next_page(rj)
+
+    def map(self, fun, items, workers=4):
+        """
+        Call fun on each item from a pool of threads sharing this client's connections and
+        rate limit, results are returned in the order of items.
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fun, items))
@@ -1,16 +1,23 @@
+import functools
+
+
+@functools.lru_cache(maxsize=None)
 def api():
     from . import load_api_spec
     return load_api_spec('crawlers/coinmetrics-community.yaml')
 
-def get_assets(assets):
+def default_client(base_url=None):
+    from . import get_client
+    return get_client('crawlers/coinmetrics-community.yaml', base_url)
+
+def get_assets(assets, client=None):
     if type(assets) is list:
         assets = ','.join(assets)
-    import requests
-    resp = requests.get(api().asset_metadata(assets=assets))
-    return resp.json()['data']
+    client = client or default_client()
+    return client.get_json(client.url('asset_metadata', assets=assets))['data']
 
-def get_asset_features(asset_name, frequency):
-    assets = get_assets(asset_name)
+def get_asset_features(asset_name, frequency, client=None):
+    assets = get_assets(asset_name, client=client)
     result = []
     id = 1
     for asset in assets:
@@ -21,42 +28,97 @@ def get_asset_features(asset_name, frequency):
                     id += 1
     return result
 
-def get_asset_metrics(asset_name, metrics, frequency, begin, end):
+def get_asset_metrics(asset_name, metrics, frequency, begin, end, client=None):
     if type(metrics) is list:
         metrics = ','.join(metrics)
-    import requests
-    resp = requests.get(api().metrics_timeseries(assets=asset_name, metrics=metrics, frequency=frequency, begin=begin, end=end))
-    rj = resp.json()
-    result = rj['data']
-    import time
-    if 'next_page_url' in rj:
-        while True:
-            time.sleep(0.5)
-            resp = requests.get(rj['next_page_url'])
-            rj = resp.json()
-            result += rj['data']
-            if not 'next_page_url' in rj:
-                break
+    client = client or default_client()
+    url = client.url('metrics_timeseries', assets=asset_name, metrics=metrics, frequency=frequency, begin=begin, end=end)
+    result = []
+    for page in client.get_pages(url):
+        result += page['data']
     return result
 
+def get_assets_metrics(asset_names, metrics, frequency, begin, end, workers=4, client=None):
+    """
+    Fetch metrics of several assets concurrently, pages of each asset are fetched in order.
+    :return: dict of asset_name: records, as returned by get_asset_metrics
+    """
+    client = client or default_client()
+    results = client.map(lambda a: get_asset_metrics(a, metrics, frequency, begin, end, client=client),
+                         asset_names, workers=workers)
+    return dict(zip(asset_names, results))
+
 
-def get_bootstrap_data(symbol):
+def _records_to_df(records, metrics):
+    import pandas as pd
+    df = pd.DataFrame.from_records(records)
+    index = pd.DatetimeIndex(pd.to_datetime(df['time'], utc=True).dt.tz_convert(None), name='timestamp')
+    df = df.reindex(columns=metrics).apply(pd.to_numeric, errors='coerce')
+    df.index = index
+    return df
+
+def crawl_asset_metrics(asset_name, metrics, frequency, begin, end=None, storename=None, client=None):
+    """
+    Fetch the records of each metric newer than its checkpoint (or from begin for new metrics) and
+    upsert each page into the featurestore as it arrives, moving the checkpoints forward after each
+    page. An interrupted crawl resumes from the last stored page, a refresh only fetches new records.
+    :param end: last timestamp to fetch, defaults to now
+    :param storename: featurestore table, defaults to coinmetrics_<asset_name>_<frequency>
+    :return: number of records written
+    """
+    import pandas as pd
+    import featurestore
+    if type(metrics) is str:
+        metrics = metrics.split(',')
+    client = client or default_client()
+    storename = storename or 'coinmetrics_{}_{}'.format(asset_name, frequency)
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp.utcnow().tz_convert(None)
+    # Metrics with the same checkpoint are fetched together. The checkpoint's record is fetched
+    # again, since the upsert makes overlaps harmless while a gap would be lost.
+    by_start = {}
+    for m, checkpoint in featurestore.get_checkpoints('coinmetrics', asset_name, metrics).items():
+        start = max(pd.Timestamp(begin), checkpoint) if checkpoint is not None else pd.Timestamp(begin)
+        by_start.setdefault(start, []).append(m)
+    written = 0
+    for start, _metrics in sorted(by_start.items()):
+        if start > end:
+            continue
+        url = client.url('metrics_timeseries', assets=asset_name, metrics=','.join(_metrics), frequency=frequency,
+                         begin=start.isoformat() + 'Z', end=end.isoformat() + 'Z')
+        for page in client.get_pages(url):
+            if not page['data']:
+                continue
+            df = _records_to_df(page['data'], _metrics)
+            written += featurestore.save_df(storename, df, mode='upsert')
+            featurestore.set_checkpoints('coinmetrics', asset_name, _metrics, df.index.max())
+    return written
+
+
+def get_bootstrap_data(symbol, cache=None, workers=None):
+    """
+    Members of a symbol's group are loaded concurrently with the transformer's get_df and merged
+    on their timestamps.
+    :param cache: optional conversion cache, see crawlers.get_conversion_cache
+    :param workers: threads loading group members, see crawlers.map_concurrent
+    """
     symbol = symbol.lower()
 
-    from . import bootstrap_index, load_transformer
+    from . import bootstrap_index, load_transformer, load_converted, map_concurrent, merge_aligned
     try:
         index = bootstrap_index('../data/bootstrap/index.yaml')
         transformer = load_transformer('../data/bootstrap/' + index.coinmetrics.transformer)
+        zip_file = '../data/bootstrap/' + index.coinmetrics.zipfile
+
+        def get_df(filename):
+            return load_converted(zip_file, filename, transformer.__file__,
+                                  lambda: transformer.get_df(zip_file, filename), params=('get_df',), cache=cache)
         if symbol not in index.coinmetrics.groups:
             filename = index.coinmetrics.name_format.format(symbol=symbol) + '.csv'
-            return transformer.get_df('../data/bootstrap/' + index.coinmetrics.zipfile, filename)
+            return get_df(filename)
         else:
             filenames = [index.coinmetrics.name_format.format(symbol=symbol) + '.csv']
             filenames += [ name + '.csv' for name in index.coinmetrics.groups[symbol]]
-            dataframes = [transformer.get_df('../data/bootstrap/' + index.coinmetrics.zipfile, filename) for filename in filenames]
-
-            import pandas as pd
-            return pd.concat(dataframes)
+            return merge_aligned(map_concurrent(get_df, filenames, workers=workers))
     except Exception as e:
         print('Exception occurred!    ' + str(e))
         raise
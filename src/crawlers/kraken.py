@@ -1,28 +1,68 @@
+import functools
+import numpy as np
+import pandas as pd
+
+
+@functools.lru_cache(maxsize=None)
 def api():
     from . import load_api_spec
     return load_api_spec('crawlers/kraken.yaml')
 
-def get_pair_ohlc(pair, metrics, frequency, begin, end):
-    global kraken
-    if type(metrics) is list:
-        metrics = ','.join(metrics)
-    import requests
-    resp = requests.get(api().ohlc_data(assets=pair, metrics=metrics, frequency=frequency, since=0))
-    rj = resp.json()
-    result = rj['data']
-    import time
-    if 'next_page_url' in rj:
-        while True:
-            time.sleep(0.5)
-            resp = requests.get(rj['next_page_url'])
-            rj = resp.json()
-            result += rj['data']
-            if not 'next_page_url' in rj:
-                break
-    return result
-
-
-def get_bootstrap_data(symbol, currency):
+def default_client(base_url=None):
+    from . import get_client
+    return get_client('crawlers/kraken.yaml', base_url)
+
+def get_pair_ohlc(pair, interval=1440, since=0, client=None):
+    """
+    OHLC records of a pair since a unix timestamp, in a single request since Kraken only serves
+    the latest 720 records of each interval. The last record is the interval still in progress.
+    :param interval: minutes in each record, eg. 1440 for daily records
+    :return: list of [time, open, high, low, close, vwap, volume, count]
+    """
+    client = client or default_client()
+    rj = client.get_json(client.url('ohlc_data', pair=pair, interval=interval, since=since))
+    if rj.get('error'):
+        raise ValueError('Kraken error: {}'.format(', '.join(rj['error'])))
+    result = rj['result']
+    result.pop('last')
+    # A single pair is requested, its key is Kraken's pair name (eg. XXBTZUSD for XBTUSD)
+    return next(iter(result.values()), [])
+
+def get_pairs_ohlc(pairs, interval=1440, since=0, workers=4, client=None):
+    """
+    :return: dict of pair: records, fetched concurrently with get_pair_ohlc
+    """
+    client = client or default_client()
+    results = client.map(lambda p: get_pair_ohlc(p, interval=interval, since=since, client=client), pairs, workers=workers)
+    return dict(zip(pairs, results))
+
+
+def crawl_pair_ohlc(pair, interval=1440, storename=None, client=None):
+    """
+    Fetch the OHLC records of a pair newer than its checkpoint and upsert them into the featurestore,
+    the record at the checkpoint is fetched again since it may have been stored while in progress.
+    :param storename: featurestore table, defaults to kraken_<pair>_<interval>
+    :return: number of records written
+    """
+    import featurestore
+    storename = storename or 'kraken_{}_{}'.format(pair, interval)
+    metric = 'ohlc_{}'.format(interval)
+    checkpoint = featurestore.get_checkpoints('kraken', pair, [metric])[metric]
+    since = (checkpoint - pd.Timestamp(0)) // pd.Timedelta('1s') - 1 if checkpoint is not None else 0
+    records = get_pair_ohlc(pair, interval=interval, since=since, client=client)
+    if not records:
+        return 0
+    df = pd.DataFrame(records, columns=['time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count'])
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop('time'), unit='s'), name='timestamp')
+    df = df.astype(np.float64)
+    written = featurestore.save_df(storename, df, mode='upsert')
+    featurestore.set_checkpoints('kraken', pair, [metric], df.index.max())
+    return written
+
+
+def _bootstrap_source(symbol, currency):
+    # Zip file, member name, transformer and layout of a pair's trade history, layout 'trades'
+    # declares the members are raw Kraken trade files (see read_trades)
     from . import bootstrap_index, load_transformer
     _convert_map = {
         'btc':'xbt',
@@ -32,13 +72,23 @@ def get_bootstrap_data(symbol, currency):
         symbol = _convert_map[symbol]
     if currency in _convert_map:
         currency = _convert_map[currency]
+    index = bootstrap_index('../data/bootstrap/index.yaml')
+    transformer = load_transformer('../data/bootstrap/' + index.kraken.transformer)
+    if index.kraken.groups:
+        raise ValueError('Groups are not supported for kraken Loader')
+    filename = index.kraken.name_format.format(symbol=symbol.upper(), currency=currency.upper()) + '.csv'
+    return '../data/bootstrap/' + index.kraken.zipfile, filename, transformer, index.kraken.get('layout')
+
+
+def get_bootstrap_data(symbol, currency, cache=None):
+    """
+    :param cache: optional conversion cache, see crawlers.get_conversion_cache
+    """
+    from . import load_converted
     try:
-        index = bootstrap_index('../data/bootstrap/index.yaml')
-        transformer = load_transformer('../data/bootstrap/' + index.kraken.transformer)
-        if index.kraken.groups:
-            raise ValueError('Groups are not supported for kraken Loader')
-        filename = index.kraken.name_format.format(symbol=symbol.upper(), currency=currency.upper()) + '.csv'
-        return transformer.get_df('../data/bootstrap/' + index.kraken.zipfile, filename)
+        zip_file, filename, transformer, _ = _bootstrap_source(symbol, currency)
+        return load_converted(zip_file, filename, transformer.__file__,
+                              lambda: transformer.get_df(zip_file, filename), params=('get_df',), cache=cache)
     except Exception as e:
         print('Exception occurred!    ' + str(e))
         raise
@@ -48,4 +98,141 @@ def ticks_to_ohlcv(ticks, interval):
     resample = ticks.resample(interval)
     ohlc = resample['price'].ohlc()
     ohlc['volume'] = resample['amount'].sum()
-    return ohlc
\ No newline at end of file
+    return ohlc
+
+
+def read_trades(zip_file, filename, chunksize=1000000):
+    """
+    Iterate over a Kraken trade history csv (unix timestamp, price, volume without header)
+    inside a zip file, in chunks of ticks with the same layout as get_bootstrap_data.
+    Used for the bootstrap index's kraken members when it declares `layout: trades`.
+    """
+    import zipfile
+    with zipfile.ZipFile(zip_file) as z:
+        with z.open(filename) as f:
+            for chunk in pd.read_csv(f, header=None, names=['timestamp', 'price', 'amount'], chunksize=chunksize):
+                chunk.index = pd.to_datetime(chunk.pop('timestamp'), unit='s')
+                yield chunk
+
+
+class OHLCVAggregator:
+    """
+    Aggregate time sorted ticks into bars of an interval, one chunk at a time: the last bar of
+    each chunk is kept open and merged with the first bar of the next chunk when they match.
+    Bars are aligned as resample does for intervals dividing a day (eg. 1min, 1h, 1D), open and
+    close are the first and last prices that are not missing, as in resample().ohlc().
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.step = pd.Timedelta(interval).value
+        if pd.Timedelta('1D').value % self.step:
+            raise ValueError('Interval {} does not divide a day'.format(interval))
+        self.bars = []
+        self.partial = None
+
+    def update(self, timestamps, price, amount):
+        """
+        :param timestamps: int64 nanoseconds since epoch, eg. DatetimeIndex.asi8
+        """
+        if timestamps.shape[0] == 0:
+            return
+        keys = timestamps // self.step
+        if (keys[1:] < keys[:-1]).any() or (self.partial is not None and keys[0] < self.partial[0][0]):
+            raise ValueError('Ticks must be sorted by time')
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], keys.shape[0]] - 1
+        # Positions of the first and last prices of each bar, skipping missing ones
+        n = keys.shape[0]
+        valid = ~np.isnan(price)
+        positions = np.arange(n)
+        first = np.minimum.reduceat(np.where(valid, positions, n), starts)
+        last = np.maximum.reduceat(np.where(valid, positions, -1), starts)
+        padded = np.r_[price, np.nan]  # Bars without prices point at the trailing NaN
+        bars = [
+            keys[starts],
+            padded[np.where(first <= ends, first, n)],
+            np.fmax.reduceat(price, starts),
+            np.fmin.reduceat(price, starts),
+            padded[np.where(last >= starts, last, n)],
+            np.add.reduceat(np.nan_to_num(amount), starts)
+        ]
+        if self.partial is not None:
+            if self.partial[0][0] == bars[0][0]:
+                # The open bar continues in this chunk
+                _key, _open, _high, _low, _close, _volume = (b[0] for b in self.partial)
+                if not np.isnan(_open):
+                    bars[1][0] = _open
+                bars[2][0] = np.fmax(_high, bars[2][0])
+                bars[3][0] = np.fmin(_low, bars[3][0])
+                if np.isnan(bars[4][0]):
+                    bars[4][0] = _close
+                bars[5][0] += _volume
+            else:
+                self.bars.append(self.partial)
+        self.bars.append([b[:-1] for b in bars])
+        self.partial = [b[-1:] for b in bars]
+
+    def result(self):
+        bars = self.bars + ([self.partial] if self.partial is not None else [])
+        if not bars:
+            return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'])
+        keys, _open, _high, _low, _close, _volume = (np.concatenate(b) for b in zip(*bars))
+        index = pd.to_datetime(keys * self.step)
+        ohlcv = pd.DataFrame({'open': _open, 'high': _high, 'low': _low, 'close': _close, 'volume': _volume}, index=index)
+        # Intervals without ticks, as resample reports them
+        full = pd.date_range(index[0], index[-1], freq=pd.Timedelta(self.interval))
+        ohlcv = ohlcv.reindex(full)
+        ohlcv['volume'] = ohlcv['volume'].fillna(0)
+        return ohlcv
+
+
+def stream_ohlcv(chunks, intervals):
+    """
+    Aggregate chunks of ticks (dataframes indexed by time with price and amount columns)
+    into bars of each interval in one pass, holding a single chunk at a time.
+    Missing prices and amounts are forward filled across chunks, like
+    get_bootstrap_data(...).fillna(method='ffill') followed by ticks_to_ohlcv.
+    :return: dict of ohlcv dataframes by interval
+    """
+    aggregators = {i: OHLCVAggregator(i) for i in intervals}
+    last = None
+    for chunk in chunks:
+        # Only leading values are still missing after the forward fill, they continue the previous chunk
+        chunk = chunk[['price', 'amount']].fillna(method='ffill')
+        if last is not None:
+            chunk = chunk.fillna(last)
+        if chunk.empty:
+            continue
+        last = chunk.iloc[-1]
+        timestamps = chunk.index.asi8
+        price = chunk['price'].to_numpy(dtype=np.float64)
+        amount = chunk['amount'].to_numpy(dtype=np.float64)
+        for aggregator in aggregators.values():
+            aggregator.update(timestamps, price, amount)
+    return {i: a.result() for i, a in aggregators.items()}
+
+
+def get_bootstrap_ohlcv(symbol, currency, intervals=('1D',), chunksize=1000000, cache=None):
+    """
+    Bars of each interval from the pair's trade history, aggregated from chunks of ticks.
+    Members are streamed with read_trades when the bootstrap index declares `layout: trades`, or
+    with the transformer's iter_df(zip_file, filename, chunksize) when it has one, otherwise the
+    whole history is read at once with the transformer's get_df.
+    :param cache: optional conversion cache, see crawlers.get_conversion_cache
+    :return: dict of ohlcv dataframes by interval
+    """
+    from . import load_converted
+    zip_file, filename, transformer, layout = _bootstrap_source(symbol, currency)
+
+    def convert():
+        if layout == 'trades':
+            chunks = read_trades(zip_file, filename, chunksize)
+        elif hasattr(transformer, 'iter_df'):
+            chunks = transformer.iter_df(zip_file, filename, chunksize)
+        else:
+            print('Warning: reading the whole trade history of {} in memory, declare `layout: trades` for kraken '
+                  'in the bootstrap index or implement iter_df in its transformer to stream it'.format(filename))
+            chunks = [transformer.get_df(zip_file, filename)]
+        return stream_ohlcv(chunks, intervals)
+    return load_converted(zip_file, filename, transformer.__file__, convert,
+                          params=('ohlcv', tuple(intervals), layout), cache=cache)
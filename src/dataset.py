@@ -20,46 +20,165 @@ TA_CONFIG = {
     'obv': None
 }
 
+# Indicators computed by make_ohlcv_ta as (columns, indicator, params), see features.indicators
+TA_INDICATORS = [
+    ('adx', 'ADX', {'period': 14}),
+    ('adxr', 'ADXR', {'period': 14}),
+    ('apo', 'APO', {'fast': 12, 'slow': 26, 'matype': 0}),
+    (['aroon_down', 'aroon_up'], 'AROON', {'period': 14}),
+    ('aroonosc', 'AROONOSC', {'period': 14}),
+    ('bop', 'BOP', {}),
+    ('cmo', 'CMO', {'period': 14}),
+    ('cci', 'CCI', {'period': 14}),
+    ('dx', 'DX', {'period': 14}),
+    (['macd', 'macdsignal', 'macdhist'], 'MACD', {'fast': 12, 'slow': 26, 'signal': 9}),
+    ('mfi', 'MFI', {'period': 14}),
+    ('minus_di', 'MINUS_DI', {'period': 14}),
+    ('minus_dm', 'MINUS_DM', {'period': 14}),
+    ('mom', 'MOM', {'period': 10}),
+    ('plus_di', 'PLUS_DI', {'period': 14}),
+    ('plus_dm', 'PLUS_DM', {'period': 14}),
+    ('ppo', 'PPO', {'fast': 12, 'slow': 26}),
+    ('roc', 'ROC', {'period': 10}),
+    ('rocp', 'ROCP', {'period': 10}),
+    ('rocr', 'ROCR', {'period': 10}),
+    ('rocr100', 'ROCR100', {'period': 10}),
+    ('rsi', 'RSI', {'period': 14}),
+    (['stoch_slowk', 'stoch_slowd'], 'STOCH', {'fastk': 5, 'slowk': 3, 'slowd': 3}),
+    (['stochf_fastk', 'stochf_fastd'], 'STOCHF', {'fastk': 5, 'fastd': 3}),
+    (['stochrsi_fastk', 'stochrsi_fastd'], 'STOCHRSI', {'period': 14, 'fastk': 5, 'fastd': 3}),
+    ('trix', 'TRIX', {'period': 30}),
+    ('ultosc', 'ULTOSC', {'periods': (7, 14, 28)}),
+    ('willr', 'WILLR', {'period': 14}),
+    ('atr', 'ATR', {'period': 14}),
+    ('natr', 'NATR', {'period': 14}),
+    ('trange', 'TRANGE', {}),
+    ('ad', 'AD', {}),
+    ('adosc', 'ADOSC', {'fast': 3, 'slow': 10}),
+    ('obv', 'OBV', {}),
+    # Missing from TA-Lib, computed with PyTi
+    ('fi', 'force_index', {}),
+    ('tsi', 'tsi', {}),
+    ('pvo_12_26', 'pvo', {'short': 12, 'long': 26}),
+    ('adi', 'adi', {}),
+    ('rsma_3_7', 'rsma', {'short': 3, 'long': 7}),
+    ('rema_3_7', 'rema', {'short': 3, 'long': 7}),
+    ('rsma_12_26', 'rsma', {'short': 12, 'long': 26}),
+    ('rema_12_26', 'rema', {'short': 12, 'long': 26}),
+    ('rsma_24_50', 'rsma', {'short': 24, 'long': 50}),
+    ('rema_24_50', 'rema', {'short': 24, 'long': 50}),
+]
+
+# Recursive indicators (EMA, Wilder smoothing) never fully forget their seed, so
+# the look-back used when updating a dataset is a multiple of the longest TA period:
+# after TA_WARMUP periods the difference from a full rebuild is below float precision.
+TA_LONGEST_PERIOD = 50
+TA_WARMUP = 20
+
+# Running totals (AD, OBV, ADI) depend on the whole history: when updating a dataset
+# they are re-based on the last stored record instead.
+CUMULATIVE_FEATURES = ['ad', 'obv', 'adi']
+
+
+def profile_features(df: pd.DataFrame, chunksize=64):
+    """
+    Statistics of each feature, computed on chunks of columns of the underlying array:
+    first and last valid index (the index bounds for features without values), count of
+    records, nulls, non-null values ('valid') and min/max.
+    The statistics of appended records can be merged with merge_feature_metadata.
+    :return: dataframe indexed by feature name
+    """
+    import numpy as np
+    n = df.shape[0]
+    stats = []
+    for j in range(0, df.shape[1], chunksize):
+        values = df.iloc[:, j:j + chunksize].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        has_values = valid.any(axis=0)
+        first = np.where(has_values, valid.argmax(axis=0), 0)
+        last = np.where(has_values, n - 1 - valid[::-1].argmax(axis=0), n - 1)
+        nulls = n - valid.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            _min = np.where(has_values, np.where(valid, values, np.inf).min(axis=0), np.nan)
+            _max = np.where(has_values, np.where(valid, values, -np.inf).max(axis=0), np.nan)
+        stats.append(pd.DataFrame({
+            'first': [t.isoformat() for t in df.index[first].to_pydatetime()],
+            'last': [t.isoformat() for t in df.index[last].to_pydatetime()],
+            'count': n,
+            'null': nulls,
+            'valid': n - nulls,
+            'min': _min,
+            'max': _max
+        }, index=[str(c) for c in df.columns[j:j + chunksize]]))
+    meta = pd.concat(stats) if stats else pd.DataFrame(columns=['first', 'last', 'count', 'null', 'valid', 'min', 'max'])
+    meta.index.name = 'feature'
+    return meta
+
+
+def merge_feature_metadata(meta: pd.DataFrame, new: pd.DataFrame):
+    """
+    Merge the statistics of appended records into the existing ones, without rescanning them.
+    Features missing from either side are left as they are; min and max are only kept if
+    meta already has them, eg. not for metadata written before they were collected.
+    :param meta: existing statistics, eg. as stored in the .meta.csv file, indexed by feature name
+    :param new: statistics of the appended records, from profile_features
+    """
+    import numpy as np
+    # Metadata written before the non-null count was named 'valid'
+    meta = meta.rename(columns={'distinct': 'valid'})
+    common = new.index.intersection(meta.index)
+    old, new = meta.loc[common], new.loc[common]
+    had_values = (old['null'] < old['count']).values
+    has_values = (new['null'] < new['count']).values
+    meta.loc[common, 'first'] = np.where(had_values | ~has_values, old['first'], new['first'])
+    meta.loc[common, 'last'] = np.where(has_values | ~had_values, new['last'], old['last'])
+    for k in ['count', 'null', 'valid']:
+        meta.loc[common, k] = old[k].values + new[k].values
+    if 'min' in meta.columns and 'max' in meta.columns:
+        meta.loc[common, 'min'] = np.fmin(old['min'].values, new['min'].values)
+        meta.loc[common, 'max'] = np.fmax(old['max'].values, new['max'].values)
+    return meta
+
+
+def get_valid_range(meta: pd.DataFrame):
+    """
+    Range where every feature has values: latest first valid index, earliest last valid index.
+    """
+    global_first = max(pd.to_datetime(meta['first'])).to_pydatetime()
+    global_last = min(pd.to_datetime(meta['last'])).to_pydatetime()
+    return global_first.isoformat(), global_last.isoformat()
+
 
 def get_feature_metadata(df):
-    feature_indices = []
-    global_first = None
-    global_last = None
-    for c in df.columns:
-        # If all elements are non-NA/null, first_valid_index and last_valid_index return None.
-        # They also return None for empty Series/DataFrame.
-        if df[c].empty:
-            print("Feature {} is empty!".format(c))
-            continue
-        fvi = df[c].first_valid_index() or df[c].index.min()
-        lvi = df[c].last_valid_index() or df[c].index.max()
-        _first = fvi.to_pydatetime()
-        _last = lvi.to_pydatetime()
-        feature_indices.append({
-            'name': str(c),
-            'first': _first.isoformat(),
-            'last': _last.isoformat(),
-            'count': df[c].shape[0],
-            'null': df[c].isna().sum(),
-            'distinct': df[c].value_counts().sum()
-        })
-        if not global_first or _first > global_first:
-            global_first = _first
-        if not global_last or _last < global_last:
-            global_last = _last
-    return global_first.isoformat(), global_last.isoformat(), feature_indices
-
-
-def make_ohlcv_lags(ohlcv, W):
-    from features.lagging import make_lagged
-    lagged_ohlcv = pd.concat(
-        [make_lagged(ohlcv, i) for i in range(1, W + 1)],
-        axis='columns',
-        verify_integrity=True,
-        sort=True,
-        join='inner'
-    )
-    return lagged_ohlcv
+    """
+    :return: global first and last valid index, list of feature statistics from profile_features
+    """
+    if df.empty:
+        print("Dataset is empty!")
+        return None, None, []
+    meta = profile_features(df)
+    _begin, _end = get_valid_range(meta)
+    return _begin, _end, meta.reset_index().rename(columns={'feature': 'name'}).to_dict('records')
+
+
+def update_feature_metadata(meta: pd.DataFrame, df: pd.DataFrame):
+    """
+    Merge statistics of records appended to a dataset into its existing feature metadata.
+    :param meta: metadata as stored in the .meta.csv file, indexed by feature name
+    :param df: appended records
+    :return: global first and last valid index, updated metadata
+    """
+    meta = merge_feature_metadata(meta, profile_features(df))
+    _begin, _end = get_valid_range(meta)
+    return _begin, _end, meta
+
+
+def make_ohlcv_lags(ohlcv, W, dtype=None):
+    """
+    :param dtype: dtype of the lagged features, eg. 'float32' (default float64)
+    """
+    from features.lagging import make_lag_matrix
+    return make_lag_matrix(ohlcv, W, dtype=dtype or 'float64')
 
 
 def make_ohlcv_pct(ohlcv):
@@ -69,17 +188,28 @@ def make_ohlcv_pct(ohlcv):
 
 
 def make_ohlc_patterns(ohlcv):
-    from features.talib import get_talib_patterns
-    _patterns = get_talib_patterns(ohlcv)
+    from features.talib import get_talib_pattern_aggregates
+    _mean, _sum = get_talib_pattern_aggregates(ohlcv)
     ohlc_patterns = pd.DataFrame(index=ohlcv.index)
-    ohlc_patterns['talib_patterns_mean'] = _patterns.mean(axis=1)
-    ohlc_patterns['talib_patterns_sum'] = _patterns.sum(axis=1)
+    ohlc_patterns['talib_patterns_mean'] = _mean
+    ohlc_patterns['talib_patterns_sum'] = _sum
     return ohlc_patterns
 
 
-def make_ohlc_residual(ohlcv):
-    from features.decompose import get_residual
+def make_ohlc_residual(ohlcv, mode='full', **kwargs):
     # Residual from STL Decomposition of OHLC data
+    if mode in ['rolling', 'expanding']:
+        # Causal fits, each record only sees its past
+        from features.decompose import get_rolling_residuals
+        ohlc_residuals = get_rolling_residuals(
+            ohlcv[['open', 'high', 'low', 'close']],
+            window=kwargs.get('window', 365) if mode == 'rolling' else None,
+            cache=kwargs.get('cache'),
+            workers=kwargs.get('workers')
+        )
+        ohlc_residuals.columns = ['{}_resid'.format(c) for c in ohlc_residuals.columns]
+        return ohlc_residuals
+    from features.decompose import get_residual
     ohlc_residuals = pd.DataFrame()
     ohlc_residuals['open_resid'] = get_residual(ohlcv.open)
     ohlc_residuals['high_resid'] = get_residual(ohlcv.high)
@@ -88,26 +218,27 @@ def make_ohlc_residual(ohlcv):
     return ohlc_residuals
 
 
-def make_ohlc_splines(ohlcv):
-    from features.spline import get_spline
+def make_ohlc_splines(ohlcv, window=30):
+    from features.spline import get_splines
     # SPLINES
-    # Use SPLINES to extract price information
+    # Use SPLINES to extract price information, fitting each window once for both derivatives
     ohlc_splines = pd.DataFrame(index=ohlcv.index)
+    d1, d2 = get_splines(ohlcv[['open', 'high', 'low', 'close']], window=window, nu=(1, 2))
     # First derivative indicates slope
-    ohlc_splines['open_spl_d1'] = get_spline(ohlcv.open, 1)
-    ohlc_splines['high_spl_d1'] = get_spline(ohlcv.high, 1)
-    ohlc_splines['low_spl_d1'] = get_spline(ohlcv.low, 1)
-    ohlc_splines['close_spl_d1'] = get_spline(ohlcv.close, 1)
+    ohlc_splines['open_spl_d1'] = d1[:, 0]
+    ohlc_splines['high_spl_d1'] = d1[:, 1]
+    ohlc_splines['low_spl_d1'] = d1[:, 2]
+    ohlc_splines['close_spl_d1'] = d1[:, 3]
     # Second derivative indicates convexity
-    ohlc_splines['open_spl_d2'] = get_spline(ohlcv.open, 2)
-    ohlc_splines['high_spl_d2'] = get_spline(ohlcv.high, 2)
-    ohlc_splines['low_spl_d2'] = get_spline(ohlcv.low, 2)
-    ohlc_splines['close_spl_d2'] = get_spline(ohlcv.close, 2)
+    ohlc_splines['open_spl_d2'] = d2[:, 0]
+    ohlc_splines['high_spl_d2'] = d2[:, 1]
+    ohlc_splines['low_spl_d2'] = d2[:, 2]
+    ohlc_splines['close_spl_d2'] = d2[:, 3]
     return ohlc_splines
 
 
 def make_ohlcv_stats(ohlcv):
-    from features.ohlcv import ohlcv_resample
+    from features.ohlcv import ohlcv_rolling
 
     # Relevant stats from OHLC data interpretation
     ohlcv_stats = pd.DataFrame(index=ohlcv.index)
@@ -121,8 +252,8 @@ def make_ohlcv_stats(ohlcv):
 
 
     # Stats from resampled OHLC data
-    for d in [3, 7, 30]:
-        ohlcv_d = ohlcv_resample(ohlcv=ohlcv, period=d, interval='D')
+    candles = ohlcv_rolling(ohlcv, periods=[3, 7, 30], interval='D')
+    for d, ohlcv_d in candles.items():
         ohlcv_stats['close_open_pct_d{}'.format(d)] = (ohlcv_d.close - ohlcv_d.open).pct_change()
         ohlcv_stats['high_close_dist_pct_d{}'.format(d)] = (ohlcv_d.high - ohlcv_d.close).pct_change()
         ohlcv_stats['low_close_dist_pct_d{}'.format(d)] = (ohlcv_d.close - ohlcv_d.low).pct_change()
@@ -131,124 +262,208 @@ def make_ohlcv_stats(ohlcv):
     return ohlcv_stats
 
 
-def make_ohlcv_ta(ohlcv):
-    import talib as ta
-    result = pd.DataFrame(index=ohlcv.index)
-    result['adx'] = ta.ADX(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['adxr'] = ta.ADXR(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['apo'] = ta.APO(ohlcv.close, fastperiod=12, slowperiod=26)
-    aroon_down, aroon_up = ta.AROON(ohlcv.high, ohlcv.low, timeperiod=14)
-    result['aroon_down'] = aroon_down
-    result['aroon_up'] = aroon_up
-    result['aroonosc'] = ta.AROONOSC(ohlcv.high, ohlcv.low, timeperiod=14)
-    result['bop'] = ta.BOP(ohlcv.open, ohlcv.high, ohlcv.low, ohlcv.close)
-    result['cmo'] = ta.CMO(ohlcv.close, timeperiod=14)
-    result['cci'] = ta.CCI(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['dx'] = ta.DX(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    macd, macdsignal, macdhist = ta.MACD(ohlcv.close, fastperiod=12, slowperiod=26, signalperiod=9)
-    result['macd'] = macd
-    result['macdsignal'] = macdsignal
-    result['macdhist'] = macdhist
-    result['mfi'] = ta.MFI(ohlcv.high, ohlcv.low, ohlcv.close, ohlcv.volume, timeperiod=14)
-    result['minus_di'] = ta.MINUS_DI(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['minus_dm'] = ta.MINUS_DM(ohlcv.high, ohlcv.low, timeperiod=14)
-    result['mom'] = ta.MOM(ohlcv.close, timeperiod=10)
-    result['plus_di'] = ta.MINUS_DI(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['plus_dm'] = ta.MINUS_DM(ohlcv.high, ohlcv.low, timeperiod=14)
-    result['ppo'] = ta.PPO(ohlcv.close, fastperiod=12, slowperiod=26, matype=0)
-    result['roc'] = ta.ROC(ohlcv.close, timeperiod=10)
-    result['rocp'] = ta.ROCP(ohlcv.close, timeperiod=10)
-    result['rocr'] = ta.ROCR(ohlcv.close, timeperiod=10)
-    result['rocr100'] = ta.ROCR100(ohlcv.close, timeperiod=10)
-    result['rsi'] = ta.RSI(ohlcv.close, timeperiod=14)
-    slowk, slowd = ta.STOCH(ohlcv.high, ohlcv.low, ohlcv.close, fastk_period=5, slowk_period=3, slowk_matype=0, slowd_period=3, slowd_matype=0)
-    result['stoch_slowk'] = slowk
-    result['stoch_slowd'] = slowd
-    fastk, fastd = ta.STOCHF(ohlcv.high, ohlcv.low, ohlcv.close, fastk_period=5, fastd_period=3, fastd_matype=0)
-    result['stochf_fastk'] = fastk
-    result['stochf_fastd'] = fastd
-    rfastk, rfastd = ta.STOCHRSI(ohlcv.close, timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0)
-    result['stochrsi_fastk'] = rfastk
-    result['stochrsi_fastd'] = rfastd
-    result['trix'] = ta.TRIX(ohlcv.close, timeperiod=30)
-    result['ultosc'] = ta.ULTOSC(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod1=7, timeperiod2=14, timeperiod3=28)
-    result['willr'] = ta.WILLR(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['atr'] = ta.ATR(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['natr'] = ta.NATR(ohlcv.high, ohlcv.low, ohlcv.close, timeperiod=14)
-    result['trange'] = ta.TRANGE(ohlcv.high, ohlcv.low, ohlcv.close)
-    result['ad'] = ta.AD(ohlcv.high, ohlcv.low, ohlcv.close, ohlcv.volume)
-    result['adosc'] = ta.ADOSC(ohlcv.high, ohlcv.low, ohlcv.close, ohlcv.volume, fastperiod=3, slowperiod=10)
-    result['obv'] = ta.OBV(ohlcv.close, ohlcv.volume)
-    # Missing functions from PyTi
-    # Missing only RSMA, REMA, TSI, PVO, FI, ADI
-    from pyti.force_index import force_index
-    from pyti.true_strength_index import true_strength_index
-    from pyti.volume_oscillator import volume_oscillator
-    from pyti.accumulation_distribution import accumulation_distribution
-    from features.technical_indicators import relative_sma, relative_ema
-    result['fi'] = force_index(ohlcv.close, ohlcv.volume)
-    result['tsi'] = true_strength_index(ohlcv.close)
-    result['pvo_12_26'] = volume_oscillator(ohlcv.volume, short_period=12, long_period=26)
-    result['adi'] = accumulation_distribution(ohlcv.close, ohlcv.high, ohlcv.low, ohlcv.volume)
-    result['rsma_3_7'] = relative_sma(ohlcv.close, short=3, long=7)
-    result['rema_3_7'] = relative_ema(ohlcv.close, short=3, long=7)
-    result['rsma_12_26'] = relative_sma(ohlcv.close, short=12, long=26)
-    result['rema_12_26'] = relative_ema(ohlcv.close, short=12, long=26)
-    result['rsma_24_50'] = relative_sma(ohlcv.close, short=24, long=50)
-    result['rema_24_50'] = relative_ema(ohlcv.close, short=24, long=50)
-    return result
+def make_ohlcv_ta(ohlcv, indicators=None):
+    """
+    :param indicators: indicator specs, by default TA_INDICATORS
+    """
+    from features.indicators import compute_indicators
+    return compute_indicators(ohlcv, indicators or TA_INDICATORS)
 
 
-def make_target(ohlcv):
-    from features.targets import target_price, target_pct, target_class, target_binary, target_binned_class
+def make_target(ohlcv, periods=None):
+    """
+    Targets for each horizon in periods, columns for horizons other than 1 are suffixed
+    with the horizon, eg. class_7.
+    """
+    from features.targets import get_targets
+    periods = periods or [1]
+    targets = get_targets(ohlcv.close, periods=periods)
     result = pd.DataFrame(index=ohlcv.index)
-    result['price'] = target_price(ohlcv.close)
-    result['pct'] = target_pct(ohlcv.close)
-    result['class'] = target_class(ohlcv.close)
-    result['binary'] = target_binary(ohlcv.close)
-    result['bin_class'] = target_binned_class(ohlcv.close, n_bins=3)
-    result['bin_binary'] = target_binned_class(ohlcv.close, n_bins=2)
+    for j, p in enumerate(periods):
+        suffix = '' if p == 1 else '_{}'.format(p)
+        for name in ['price', 'pct', 'class', 'binary', 'bin_class', 'bin_binary']:
+            result[name + suffix] = targets[name][:, j]
     return result
 
 
-def build(ohlcv: pd.DataFrame, coinmetrics: pd.DataFrame, **kwargs):
-    W = kwargs.get('W', 10)
-    # ATSA - OHLC with 10-lag + TA
-    lagged_ohlcv = make_ohlcv_lags(ohlcv, W)
-
-    # Lagged percent variation of OHLCV
-    ohlcv_pct = make_ohlcv_pct(ohlcv)
-    lagged_ohlcv_pct = make_ohlcv_lags(ohlcv_pct, W)
-    ohlc_patterns = make_ohlc_patterns(ohlcv)
-    # ohlc_splines = make_ohlc_splines(ohlcv)
-    ohlc_residuals = make_ohlc_residual(ohlcv)
-    lagged_ohlc_residuals = make_ohlcv_lags(ohlc_residuals, W=10)
-    ohlcv_stats = make_ohlcv_stats(ohlcv)
-    # from features.technical_indicators import get_ta_features
-    # ta = get_ta_features(ohlcv, TA_CONFIG)
-    ta = make_ohlcv_ta(ohlcv)
-
+def make_coinmetrics_pct(coinmetrics):
     cm_percent = coinmetrics.pct_change(periods=1, fill_method='ffill')
     cm_percent.columns = [c+'_pct' for c in cm_percent.columns]
+    return cm_percent
+
+
+def build_groups(ohlcv: pd.DataFrame, coinmetrics: pd.DataFrame, **kwargs):
+    """
+    Build the dataset's feature groups, facets run concurrently as soon as their inputs are available.
+    :param executor: 'thread' (default), 'process' or None to build facets serially.
+        With 'process' the stl_cache is not updated, since facets run in other processes.
+    :param workers: maximum number of facets built at the same time
+    :param cache: optional util.cache.DiskCache, facets whose inputs and parameters are unchanged
+        are loaded from it instead of being computed
+    :param float32: build the lagged facets as float32
+    :param residuals: precomputed ohlc_residuals facet, eg. full STL residuals fit over a longer
+        history than ohlcv (see build_tail)
+    """
+    import time
+    from util.scheduler import run_facets, print_timings
+    W = kwargs.get('W', 10)
+    lag_dtype = 'float32' if kwargs.get('float32') else None
+    facets = {
+        # ATSA - OHLC with 10-lag + TA
+        'lagged_ohlcv': (make_ohlcv_lags, ['ohlcv'], {'W': W, 'dtype': lag_dtype}),
+        # Lagged percent variation of OHLCV
+        'ohlcv_pct': (make_ohlcv_pct, ['ohlcv'], {}),
+        'lagged_ohlcv_pct': (make_ohlcv_lags, ['ohlcv_pct'], {'W': W, 'dtype': lag_dtype}),
+        'ohlc_patterns': (make_ohlc_patterns, ['ohlcv'], {}),
+        'ohlc_splines': (make_ohlc_splines, ['ohlcv'], {'window': kwargs.get('spline_window', 30)}),
+        'ohlc_residuals': (make_ohlc_residual, ['ohlcv'], {
+            'mode': kwargs.get('stl_mode', 'full'),
+            'window': kwargs.get('stl_window', 365),
+            'cache': kwargs.get('stl_cache'),
+            'workers': kwargs.get('workers')
+        }),
+        'lagged_ohlc_residuals': (make_ohlcv_lags, ['ohlc_residuals'], {'W': 10, 'dtype': lag_dtype}),
+        'ohlcv_stats': (make_ohlcv_stats, ['ohlcv'], {}),
+        # 'ta': (get_ta_features, ['ohlcv'], {'indicators': TA_CONFIG}),
+        'ta': (make_ohlcv_ta, ['ohlcv'], {'indicators': TA_INDICATORS}),
+        'cm_percent': (make_coinmetrics_pct, ['coinmetrics'], {})
+    }
+    inputs = {'ohlcv': ohlcv, 'coinmetrics': coinmetrics}
+    if kwargs.get('residuals') is not None:
+        del facets['ohlc_residuals']
+        inputs['ohlc_residuals'] = kwargs.get('residuals')
+    begin = time.perf_counter()
+    results, timings = run_facets(
+        facets,
+        inputs=inputs,
+        executor=kwargs.get('executor', 'thread'),
+        workers=kwargs.get('workers'),
+        cache=kwargs.get('cache')
+    )
+    print_timings(timings, total=time.perf_counter() - begin)
+    if kwargs.get('cache') is not None:
+        print('Facet cache: {}'.format(kwargs.get('cache').stats()))
 
-    merge_dataframes = [
-        ohlcv, lagged_ohlcv,
-        ohlcv_pct, lagged_ohlcv_pct,
-        ohlc_residuals, lagged_ohlc_residuals,
-        ohlcv_stats,
-        ohlc_patterns,
-        ta,
-        coinmetrics, cm_percent
-    ]
+    groups = {name: results[name] for name in [
+        'ohlcv', 'lagged_ohlcv',
+        'ohlcv_pct', 'lagged_ohlcv_pct',
+        'ohlc_residuals', 'lagged_ohlc_residuals',
+        'ohlcv_stats',
+        'ohlc_patterns',
+        'ohlc_splines',
+        'ta',
+        'coinmetrics', 'cm_percent'
+    ]}
 
     # Drop columns whose values are all nan or inf from each facet
     with pd.option_context('mode.use_inf_as_na', True):  # Set option temporarily
-        for _df in merge_dataframes:
+        for _df in groups.values():
             _df.dropna(axis='columns', how='all', inplace=True)
-    return pd.concat(
-        merge_dataframes,
-        axis='columns',
-        verify_integrity=True,
-        sort=True,
-        join='outer'
-    )
+    return groups
+
+
+def assemble(groups: dict, dtype=None):
+    """
+    Join feature groups like build's outer concat, writing each facet straight into a
+    preallocated block on the union of their indexes. Groups are removed from the dict once
+    written, so that facets can be freed as the block fills up.
+    :param dtype: dtype of the block, default float64
+    """
+    import numpy as np
+    columns = pd.Index([c for df in groups.values() for c in df.columns])
+    if columns.has_duplicates:
+        raise ValueError('Indexes have overlapping values: {}'.format(list(columns[columns.duplicated()])))
+    index = None
+    for df in groups.values():
+        index = df.index if index is None else index.union(df.index)
+    if not index.is_monotonic_increasing:
+        index = index.sort_values()
+    # Column-major and not initialized: each facet only touches the pages of its own columns,
+    # so memory grows as the block fills while the facets already written are freed.
+    result = np.empty((index.shape[0], columns.shape[0]), dtype=dtype or np.float64, order='F')
+    j = 0
+    for name in list(groups):
+        df = groups.pop(name)
+        block = result[:, j:j + df.shape[1]]
+        if df.index.equals(index):
+            block[:] = df.to_numpy(dtype=result.dtype)
+        else:
+            block[:] = np.nan
+            block[index.get_indexer(df.index)] = df.to_numpy(dtype=result.dtype)
+        j += df.shape[1]
+        del df, block
+    return pd.DataFrame(result, index=index, columns=columns, copy=False)
+
+
+def build(ohlcv: pd.DataFrame, coinmetrics: pd.DataFrame, **kwargs):
+    """
+    Build the dataset by joining the feature groups from build_groups.
+    :param assembly: 'concat' (default) joins the groups with pd.concat, 'block' uses assemble
+        to roughly halve peak memory (all features become float64, or float32 with float32=True)
+    """
+    from util.scheduler import peak_rss
+    groups = build_groups(ohlcv, coinmetrics, **kwargs)
+    if kwargs.get('assembly', 'concat') == 'block':
+        result = assemble(groups, dtype='float32' if kwargs.get('float32') else None)
+    else:
+        result = pd.concat(
+            list(groups.values()),
+            axis='columns',
+            verify_integrity=True,
+            sort=True,
+            join='outer'
+        )
+    if peak_rss() is not None:
+        print('Peak RSS: {:.0f}MB'.format(peak_rss()))
+    return result
+
+
+def get_lookback(**kwargs):
+    """
+    Number of trailing records each facet in `build` needs in order to recompute
+    its most recent rows, the overall look-back is the largest of them.
+    Returns None when the whole history is needed (expanding STL fits). Full STL residuals
+    are not covered, build_tail fits them over the whole history.
+    """
+    W = kwargs.get('W', 10)
+    if kwargs.get('stl_mode') == 'expanding':
+        return None
+    lookback = {
+        'lagged_ohlcv': W,
+        'lagged_ohlcv_pct': W + 1,
+        'lagged_ohlc_residuals': 10 + (kwargs.get('stl_window', 365) if kwargs.get('stl_mode') == 'rolling' else 0),
+        'ohlc_splines': kwargs.get('spline_window', 30),
+        'ohlcv_stats': 30 + 1,  # 30-day candle ending at the previous record, then pct_change
+        'ta': TA_LONGEST_PERIOD * TA_WARMUP,
+        'cm_percent': 1
+    }
+    return max(lookback.values())
+
+
+def build_tail(ohlcv: pd.DataFrame, coinmetrics: pd.DataFrame, since, anchor: pd.Series = None, **kwargs):
+    """
+    Build only the records after `since`, recomputing facets over the trailing window they need.
+    Full STL residuals (stl_mode='full', the default) are not causal: they are fit over the whole
+    history, so appended records equal a full rebuild's, while a rebuild would also revise the
+    residuals of the records already stored.
+    :param since: timestamp of the last record already in the dataset
+    :param anchor: last record already in the dataset, used to re-base cumulative features
+    :return: dataframe with the same layout as `build` containing only records after `since`
+    """
+    lookback = get_lookback(**kwargs)
+    begin_i = max(ohlcv.index.searchsorted(since, side='right') - lookback, 0) if lookback else 0
+    _ohlcv = ohlcv.iloc[begin_i:]
+    _coinmetrics = coinmetrics.loc[coinmetrics.index >= _ohlcv.index.min()]
+    if kwargs.get('stl_mode', 'full') == 'full':
+        kwargs['residuals'] = make_ohlc_residual(ohlcv, mode='full').loc[_ohlcv.index]
+    result = build(ohlcv=_ohlcv, coinmetrics=_coinmetrics, **kwargs)
+
+    if anchor is not None:
+        # Cumulative features computed over the window are off by a constant
+        for c in CUMULATIVE_FEATURES:
+            if c in result.columns and c in anchor.index and since in result.index:
+                offset = anchor[c] - result.at[since, c]
+                if pd.notna(offset):
+                    result[c] += offset
+    return result.loc[result.index > since]
+
@@ -1,6 +1,85 @@
 from statsmodels.tsa.seasonal import STL
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import numpy as np
+import hashlib
 
 def get_residual(s: pd.Series):
     res = STL(s).fit().resid
-    return pd.Series(res, index=s.index)
\ No newline at end of file
+    return pd.Series(res, index=s.index)
+
+
+def _get_period(index):
+    from statsmodels.tsa.tsatools import freq_to_period
+    freq = getattr(index, 'freq', None) or pd.infer_freq(index)
+    if not freq:
+        raise ValueError('Unable to infer STL period from index, provide it explicitly')
+    return freq_to_period(freq)
+
+
+def _window_key(values, period):
+    return hashlib.sha1(np.ascontiguousarray(values).tobytes() + str(period).encode()).hexdigest()
+
+
+def _fit_windows(values, bounds, period):
+    # Fit all columns of each window in a single task, keep the residual of the window's last record
+    result = np.empty((len(bounds), values.shape[1]))
+    for i, (begin, end) in enumerate(bounds):
+        for j in range(values.shape[1]):
+            result[i, j] = STL(values[begin:end, j], period=period).fit().resid[-1]
+    return result
+
+
+def get_rolling_residuals(df: pd.DataFrame, window=None, **kwargs):
+    """
+    Causal STL residuals: the residual at each record comes from a fit over the `window` records
+    ending there, or over all records up to there when window is None (expanding).
+    :param cache: dict mapping window contents to residuals, updated in place. Keys are content
+        hashes so appending records only fits the new windows. Entries of windows outside df are
+        removed, so the cache never outgrows the series it is used with.
+    :param workers: size of the process pool used to fit windows
+    :param chunksize: number of windows fitted by each task
+    """
+    period = kwargs.get('period') or _get_period(df.index)
+    cache = kwargs.get('cache')
+    if cache is None:
+        cache = {}
+    chunksize = kwargs.get('chunksize', 32)
+    values = df.to_numpy(dtype=np.float64)
+    min_length = 2 * period + 1
+    if window and window < min_length:
+        raise ValueError('STL window must span more than two periods ({})'.format(min_length))
+
+    result = np.full(values.shape, np.nan)
+    keys = {}
+    used = set()
+    missing = []
+    for end in range(min_length, values.shape[0] + 1):
+        begin = max(end - window, 0) if window else 0
+        key = _window_key(values[begin:end], period)
+        used.add(key)
+        if key in cache:
+            result[end - 1] = cache[key]
+        else:
+            keys[end] = key
+            missing.append((begin, end))
+
+    if missing:
+        chunks = [missing[i:i + chunksize] for i in range(0, len(missing), chunksize)]
+        with ProcessPoolExecutor(max_workers=kwargs.get('workers')) as executor:
+            # Only ship each task the slice of records its windows span
+            futures = [
+                executor.submit(
+                    _fit_windows,
+                    values[chunk[0][0]:chunk[-1][1]],
+                    [(b - chunk[0][0], e - chunk[0][0]) for b, e in chunk],
+                    period
+                ) for chunk in chunks
+            ]
+            for chunk, future in zip(chunks, futures):
+                for (begin, end), resid in zip(chunk, future.result()):
+                    result[end - 1] = resid
+                    cache[keys[end]] = resid
+    for key in [k for k in cache if k not in used]:
+        del cache[key]
+    return pd.DataFrame(result, index=df.index, columns=df.columns)
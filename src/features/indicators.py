@@ -0,0 +1,416 @@
+import talib
+import numpy as np
+import pandas as pd
+import logging
+
+# Registry of indicator functions by name: upper-case names are TA-Lib indicators,
+# lower-case names are the PyTi based ones used by get_ta_features.
+INDICATORS = {}
+# Registry of intermediate series shared between indicators, eg. moving averages
+INTERMEDIATES = {}
+
+
+def indicator(name, min_records=None):
+    """
+    Register an indicator function, called as fun(ctx, **params) and returning an array
+    or a tuple of arrays (one for each output column).
+    :param min_records: records needed to compute the indicator, by default the largest period in params
+    """
+    def decorator(fun):
+        INDICATORS[name] = (fun, min_records)
+        return fun
+    return decorator
+
+
+def intermediate(name):
+    def decorator(fun):
+        INTERMEDIATES[name] = fun
+        return fun
+    return decorator
+
+
+class IndicatorContext:
+    """
+    Holds the input series and the intermediates computed so far, so that indicators
+    sharing eg. EMA(close, 12) or the true range only compute it once.
+    """
+    def __init__(self, ohlcv):
+        self.ohlcv = ohlcv
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, *args):
+        key = (name,) + args
+        if key in self.cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.cache[key] = INTERMEDIATES[name](self, *args)
+        return self.cache[key]
+
+    def input(self, *columns):
+        if len(columns) == 1:
+            return self.get('input', columns[0])
+        return tuple(self.get('input', c) for c in columns)
+
+
+def _required_records(params):
+    periods = [v for p in params.values() for v in (p if isinstance(p, (list, tuple)) else [p])
+               if isinstance(v, int)]
+    return max(periods) if periods else 0
+
+
+def compute_indicators(ohlcv, specs, context=None):
+    """
+    Compute indicators from a declarative list of specs.
+    :param specs: list of (columns, name, params) tuples, columns is a list when the indicator has multiple outputs
+    :param context: IndicatorContext to share intermediates with other calls, by default a new one is created
+    """
+    ctx = context or IndicatorContext(ohlcv)
+    record_count = ohlcv.shape[0]
+    result = pd.DataFrame(index=ohlcv.index)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for columns, name, params in specs:
+            fun, min_records = INDICATORS[name]
+            required = min_records if min_records is not None else _required_records(params)
+            if record_count < required:
+                logging.error("compute_indicators: not enough records for {} (params={}, records={})"
+                              .format(name, params, record_count))
+                continue
+            values = fun(ctx, **params)
+            if isinstance(columns, str):
+                result[columns] = values
+            else:
+                for c, v in zip(columns, values):
+                    result[c] = v
+    return result
+
+
+# Intermediates
+@intermediate('input')
+def _input(ctx, column):
+    return np.ascontiguousarray(ctx.ohlcv[column].values, dtype=np.float64)
+
+
+@intermediate('sma')
+def _sma(ctx, column, period):
+    return talib.SMA(ctx.input(column), timeperiod=period)
+
+
+@intermediate('ema')
+def _ema(ctx, column, period):
+    # PyTi flavour (seeded with the SMA of the first period values), used by relative_ema and the oscillators
+    from pyti.exponential_moving_average import exponential_moving_average
+    return exponential_moving_average(ctx.input(column), period)
+
+
+@intermediate('trange')
+def _trange(ctx):
+    return talib.TRANGE(*ctx.input('high', 'low', 'close'))
+
+
+@intermediate('atr')
+def _atr(ctx, period):
+    return talib.ATR(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@intermediate('force_index')
+def _force_index(ctx):
+    from pyti.force_index import force_index
+    return force_index(*ctx.input('close', 'volume'))
+
+
+# TA-Lib indicators
+@indicator('ADX')
+def _ADX(ctx, period=14):
+    return talib.ADX(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('ADXR')
+def _ADXR(ctx, period=14):
+    return talib.ADXR(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('APO')
+def _APO(ctx, fast=12, slow=26, matype=0):
+    if matype:
+        return talib.APO(ctx.input('close'), fastperiod=fast, slowperiod=slow, matype=matype)
+    # Same as talib.APO with matype=0
+    return ctx.get('sma', 'close', fast) - ctx.get('sma', 'close', slow)
+
+
+@indicator('AROON')
+def _AROON(ctx, period=14):
+    return talib.AROON(*ctx.input('high', 'low'), timeperiod=period)
+
+
+@indicator('AROONOSC')
+def _AROONOSC(ctx, period=14):
+    return talib.AROONOSC(*ctx.input('high', 'low'), timeperiod=period)
+
+
+@indicator('BOP')
+def _BOP(ctx):
+    return talib.BOP(*ctx.input('open', 'high', 'low', 'close'))
+
+
+@indicator('CMO')
+def _CMO(ctx, period=14):
+    return talib.CMO(ctx.input('close'), timeperiod=period)
+
+
+@indicator('CCI')
+def _CCI(ctx, period=14):
+    return talib.CCI(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('DX')
+def _DX(ctx, period=14):
+    return talib.DX(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('MACD')
+def _MACD(ctx, fast=12, slow=26, signal=9):
+    return talib.MACD(ctx.input('close'), fastperiod=fast, slowperiod=slow, signalperiod=signal)
+
+
+@indicator('MFI')
+def _MFI(ctx, period=14):
+    return talib.MFI(*ctx.input('high', 'low', 'close', 'volume'), timeperiod=period)
+
+
+@indicator('MINUS_DI')
+def _MINUS_DI(ctx, period=14):
+    return talib.MINUS_DI(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('MINUS_DM')
+def _MINUS_DM(ctx, period=14):
+    return talib.MINUS_DM(*ctx.input('high', 'low'), timeperiod=period)
+
+
+@indicator('MOM')
+def _MOM(ctx, period=10):
+    return talib.MOM(ctx.input('close'), timeperiod=period)
+
+
+@indicator('PLUS_DI')
+def _PLUS_DI(ctx, period=14):
+    return talib.PLUS_DI(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('PLUS_DM')
+def _PLUS_DM(ctx, period=14):
+    return talib.PLUS_DM(*ctx.input('high', 'low'), timeperiod=period)
+
+
+@indicator('PPO')
+def _PPO(ctx, fast=12, slow=26):
+    # Same as talib.PPO with matype=0
+    slow_ma = ctx.get('sma', 'close', slow)
+    return ((ctx.get('sma', 'close', fast) - slow_ma) / slow_ma) * 100
+
+
+@indicator('ROC')
+def _ROC(ctx, period=10):
+    return talib.ROC(ctx.input('close'), timeperiod=period)
+
+
+@indicator('ROCP')
+def _ROCP(ctx, period=10):
+    return talib.ROCP(ctx.input('close'), timeperiod=period)
+
+
+@indicator('ROCR')
+def _ROCR(ctx, period=10):
+    return talib.ROCR(ctx.input('close'), timeperiod=period)
+
+
+@indicator('ROCR100')
+def _ROCR100(ctx, period=10):
+    return talib.ROCR100(ctx.input('close'), timeperiod=period)
+
+
+@indicator('RSI')
+def _RSI(ctx, period=14):
+    return talib.RSI(ctx.input('close'), timeperiod=period)
+
+
+@indicator('STOCH')
+def _STOCH(ctx, fastk=5, slowk=3, slowd=3):
+    return talib.STOCH(*ctx.input('high', 'low', 'close'), fastk_period=fastk, slowk_period=slowk,
+                       slowk_matype=0, slowd_period=slowd, slowd_matype=0)
+
+
+@indicator('STOCHF')
+def _STOCHF(ctx, fastk=5, fastd=3):
+    return talib.STOCHF(*ctx.input('high', 'low', 'close'), fastk_period=fastk, fastd_period=fastd,
+                        fastd_matype=0)
+
+
+@indicator('STOCHRSI')
+def _STOCHRSI(ctx, period=14, fastk=5, fastd=3):
+    return talib.STOCHRSI(ctx.input('close'), timeperiod=period, fastk_period=fastk, fastd_period=fastd,
+                          fastd_matype=0)
+
+
+@indicator('TRIX')
+def _TRIX(ctx, period=30):
+    return talib.TRIX(ctx.input('close'), timeperiod=period)
+
+
+@indicator('ULTOSC')
+def _ULTOSC(ctx, periods=(7, 14, 28)):
+    p1, p2, p3 = periods
+    return talib.ULTOSC(*ctx.input('high', 'low', 'close'), timeperiod1=p1, timeperiod2=p2, timeperiod3=p3)
+
+
+@indicator('WILLR')
+def _WILLR(ctx, period=14):
+    return talib.WILLR(*ctx.input('high', 'low', 'close'), timeperiod=period)
+
+
+@indicator('ATR')
+def _ATR(ctx, period=14):
+    return ctx.get('atr', period)
+
+
+@indicator('NATR')
+def _NATR(ctx, period=14):
+    # Same as talib.NATR
+    return (ctx.get('atr', period) / ctx.input('close')) * 100
+
+
+@indicator('TRANGE')
+def _TRANGE(ctx):
+    return ctx.get('trange')
+
+
+@indicator('AD')
+def _AD(ctx):
+    return talib.AD(*ctx.input('high', 'low', 'close', 'volume'))
+
+
+@indicator('ADOSC')
+def _ADOSC(ctx, fast=3, slow=10):
+    return talib.ADOSC(*ctx.input('high', 'low', 'close', 'volume'), fastperiod=fast, slowperiod=slow)
+
+
+@indicator('OBV')
+def _OBV(ctx):
+    return talib.OBV(*ctx.input('close', 'volume'))
+
+
+# PyTi indicators
+@indicator('rsma')
+def _rsma(ctx, short, long):
+    sma_long = ctx.get('sma', 'close', long)
+    return (ctx.get('sma', 'close', short) - sma_long) / sma_long
+
+
+@indicator('rema')
+def _rema(ctx, short, long):
+    ema_long = ctx.get('ema', 'close', long)
+    return (ctx.get('ema', 'close', short) - ema_long) / ema_long
+
+
+@indicator('macd')
+def _macd(ctx, short, long):
+    return ctx.get('ema', 'close', short) - ctx.get('ema', 'close', long)
+
+
+@indicator('ppo')
+def _ppo(ctx, short, long):
+    ema_long = ctx.get('ema', 'close', long)
+    return ((ctx.get('ema', 'close', short) - ema_long) / ema_long) * 100
+
+
+@indicator('pvo')
+def _pvo(ctx, short, long):
+    sma_long = ctx.get('sma', 'volume', long)
+    return 100 * ((ctx.get('sma', 'volume', short) - sma_long) / sma_long)
+
+
+@indicator('ao')
+def _ao(ctx, period):
+    from features.technical_indicators import aroon_oscillator
+    return aroon_oscillator(ctx.input('close'), period)
+
+
+@indicator('adx')
+def _adx(ctx, period):
+    from pyti.directional_indicators import average_directional_index
+    return average_directional_index(*ctx.input('close', 'high', 'low'), period)
+
+
+@indicator('wd')
+def _wd(ctx, period):
+    from pyti.directional_indicators import positive_directional_index, negative_directional_index
+    close, high, low = ctx.input('close', 'high', 'low')
+    return positive_directional_index(close, high, low, period) - negative_directional_index(close, high, low, period)
+
+
+@indicator('rsi')
+def _rsi(ctx, period):
+    from pyti.relative_strength_index import relative_strength_index
+    return relative_strength_index(ctx.input('close'), period)
+
+
+@indicator('mfi')
+def _mfi(ctx, period):
+    from pyti.money_flow_index import money_flow_index
+    return money_flow_index(*ctx.input('close', 'high', 'low', 'volume'), period)
+
+
+@indicator('tsi', min_records=40)
+def _tsi(ctx):
+    from pyti.true_strength_index import true_strength_index
+    return true_strength_index(ctx.input('close'))
+
+
+@indicator('boll')
+def _boll(ctx, period):
+    from pyti.bollinger_bands import percent_b
+    return percent_b(ctx.input('close'), period)
+
+
+@indicator('stoch')
+def _stoch(ctx, period):
+    from features.technical_indicators import percent_k
+    return percent_k(ctx.input('close'), period)
+
+
+@indicator('cmo')
+def _cmo(ctx, period):
+    from pyti.chande_momentum_oscillator import chande_momentum_oscillator
+    return chande_momentum_oscillator(ctx.input('close'), period)
+
+
+@indicator('atrp')
+def _atrp(ctx, period):
+    from pyti.average_true_range_percent import average_true_range_percent
+    return average_true_range_percent(ctx.input('close'), period)
+
+
+@indicator('fi')
+def _fi(ctx, period):
+    from pyti.exponential_moving_average import exponential_moving_average
+    return exponential_moving_average(ctx.get('force_index'), period)
+
+
+@indicator('force_index')
+def _force_index_raw(ctx):
+    return ctx.get('force_index')
+
+
+@indicator('adi')
+def _adi(ctx):
+    from pyti.accumulation_distribution import accumulation_distribution
+    return accumulation_distribution(*ctx.input('close', 'high', 'low', 'volume'))
+
+
+@indicator('obv')
+def _obv(ctx):
+    from pyti.on_balance_volume import on_balance_volume
+    return on_balance_volume(*ctx.input('close', 'volume'))
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Union
 
@@ -7,4 +8,25 @@ def make_lagged(df: Union[pd.Series, pd.DataFrame], periods=1):
 		shift.columns = ['{}_lag{}'.format(c, periods) for c in shift.columns]
 	elif hasattr(shift, 'name'):
 		shift.rename('{}_lag{}'.format(shift.name, periods))
-	return shift
\ No newline at end of file
+	return shift
+
+def make_lag_matrix(df: Union[pd.Series, pd.DataFrame], W, dtype=np.float64):
+	"""
+	Lags 1 to W of every column, the same as concatenating make_lagged(df, i) for i in 1..W
+	(columns {c}_lag1 for each column c, then {c}_lag2 and so on) but as a single block:
+	lags are strided views of one NaN-padded copy of df, only the result is allocated.
+	:param dtype: dtype of the result, eg. np.float32 to halve its memory
+	"""
+	from numpy.lib.stride_tricks import sliding_window_view
+	if not hasattr(df, 'columns'):
+		df = df.to_frame()
+	values = df.to_numpy(dtype=dtype)
+	n, k = values.shape
+	padded = np.full((n + W, k), np.nan, dtype=dtype)
+	padded[W:] = values
+	# windows[i, c, t] is padded[i + t, c], so lag l of row i is at t = W - l
+	windows = sliding_window_view(padded, W, axis=0)[:n, :, ::-1]
+	result = np.empty((n, W, k), dtype=dtype)
+	np.copyto(result, windows.transpose(0, 2, 1))
+	columns = ['{}_lag{}'.format(c, l) for l in range(1, W + 1) for c in df.columns]
+	return pd.DataFrame(result.reshape(n, W * k), index=df.index, columns=columns, copy=False)
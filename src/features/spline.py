@@ -1,4 +1,6 @@
-from scipy.interpolate import UnivariateSpline
+from scipy.interpolate import UnivariateSpline, make_interp_spline
+from numpy.lib.stride_tricks import sliding_window_view
+from functools import lru_cache
 import numpy as np
 
 def get_spline(y, nu, degree=3):
@@ -12,4 +14,35 @@ def get_spline(y, nu, degree=3):
         _y = y.iloc[0:i + 1]
         spl = UnivariateSpline(x_space, _y, s=0, k=degree)
         result.append(spl(i, nu=nu))
-    return result
\ No newline at end of file
+    return result
+
+@lru_cache(maxsize=None)
+def get_spline_weights(length, nu=(1, 2), degree=3):
+    # An interpolating spline (s=0) on a fixed grid is linear in y, so each derivative at the
+    # last point is a dot product with a weight vector. Fitting the spline on the identity matrix
+    # yields the weights for every derivative in nu with a single fit.
+    x_space = np.linspace(0, length - 1, length)
+    spl = make_interp_spline(x_space, np.eye(length), k=degree)
+    return np.stack([spl.derivative(n)(length - 1) for n in nu])
+
+def get_splines(y, window, nu=(1, 2), degree=3):
+    """
+    Derivatives at each row of the spline interpolating the last `window` rows of y.
+    Rows with fewer than `window` predecessors use the whole prefix, like get_spline.
+    :param y: array-like of shape (n,) or (n, columns)
+    :return: array of shape (len(nu), n, columns)
+    """
+    values = np.asarray(y, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    n = values.shape[0]
+    result = np.full((len(nu), n, values.shape[1]), np.nan)
+    # Warm-up rows, one spline per prefix
+    for length in range(degree + 1, min(window, n + 1)):
+        result[:, length - 1, :] = get_spline_weights(length, tuple(nu), degree) @ values[:length]
+    # Full windows, all rows at once
+    if n >= window:
+        windows = sliding_window_view(values, window, axis=0)
+        weights = get_spline_weights(window, tuple(nu), degree)
+        result[:, window - 1:, :] = np.einsum('icw,dw->dic', windows, weights)
+    return result
@@ -1,76 +1,115 @@
 import talib
+import numpy as np
 import pandas as pd
 
-def get_talib_patterns(ohlcv):
-    candle_names = [
-        'CDL2CROWS',
-        'CDL3BLACKCROWS',
-        'CDL3INSIDE',
-        'CDL3LINESTRIKE',
-        'CDL3OUTSIDE',
-        'CDL3STARSINSOUTH',
-        'CDL3WHITESOLDIERS',
-        'CDLABANDONEDBABY',
-        'CDLADVANCEBLOCK',
-        'CDLBELTHOLD',
-        'CDLBREAKAWAY',
-        'CDLCLOSINGMARUBOZU',
-        'CDLCONCEALBABYSWALL',
-        'CDLCOUNTERATTACK',
-        'CDLDARKCLOUDCOVER',
-        'CDLDOJI',
-        'CDLDOJISTAR',
-        'CDLDRAGONFLYDOJI',
-        'CDLENGULFING',
-        'CDLEVENINGDOJISTAR',
-        'CDLEVENINGSTAR',
-        'CDLGAPSIDESIDEWHITE',
-        'CDLGRAVESTONEDOJI',
-        'CDLHAMMER',
-        'CDLHANGINGMAN',
-        'CDLHARAMI',
-        'CDLHARAMICROSS',
-        'CDLHIGHWAVE',
-        'CDLHIKKAKE',
-        'CDLHIKKAKEMOD',
-        'CDLHOMINGPIGEON',
-        'CDLIDENTICAL3CROWS',
-        'CDLINNECK',
-        'CDLINVERTEDHAMMER',
-        'CDLKICKING',
-        'CDLKICKINGBYLENGTH',
-        'CDLLADDERBOTTOM',
-        'CDLLONGLEGGEDDOJI',
-        'CDLLONGLINE',
-        'CDLMARUBOZU',
-        'CDLMATCHINGLOW',
-        'CDLMATHOLD',
-        'CDLMORNINGDOJISTAR',
-        'CDLMORNINGSTAR',
-        'CDLONNECK',
-        'CDLPIERCING',
-        'CDLRICKSHAWMAN',
-        'CDLRISEFALL3METHODS',
-        'CDLSEPARATINGLINES',
-        'CDLSHOOTINGSTAR',
-        'CDLSHORTLINE',
-        'CDLSPINNINGTOP',
-        'CDLSTALLEDPATTERN',
-        'CDLSTICKSANDWICH',
-        'CDLTAKURI',
-        'CDLTASUKIGAP',
-        'CDLTHRUSTING',
-        'CDLTRISTAR',
-        #'CDLUNIQUE3RIVE',
-        'CDLUPSIDEGAP2CROWS',
-        'CDLXSIDEGAP3METHODS'
-    ]
-    df = pd.DataFrame(index=ohlcv.index)
-    # create columns for each pattern
-    for candle in candle_names:
-        # below is same as;
-        # df["CDL3LINESTRIKE"] = talib.CDL3LINESTRIKE(op, hi, lo, cl)
-        fun = getattr(talib, candle)
-        if fun:
-            df[candle] = fun(ohlcv.open, ohlcv.high, ohlcv.low, ohlcv.close)
-    return df
\ No newline at end of file
+CANDLE_NAMES = [
+    'CDL2CROWS',
+    'CDL3BLACKCROWS',
+    'CDL3INSIDE',
+    'CDL3LINESTRIKE',
+    'CDL3OUTSIDE',
+    'CDL3STARSINSOUTH',
+    'CDL3WHITESOLDIERS',
+    'CDLABANDONEDBABY',
+    'CDLADVANCEBLOCK',
+    'CDLBELTHOLD',
+    'CDLBREAKAWAY',
+    'CDLCLOSINGMARUBOZU',
+    'CDLCONCEALBABYSWALL',
+    'CDLCOUNTERATTACK',
+    'CDLDARKCLOUDCOVER',
+    'CDLDOJI',
+    'CDLDOJISTAR',
+    'CDLDRAGONFLYDOJI',
+    'CDLENGULFING',
+    'CDLEVENINGDOJISTAR',
+    'CDLEVENINGSTAR',
+    'CDLGAPSIDESIDEWHITE',
+    'CDLGRAVESTONEDOJI',
+    'CDLHAMMER',
+    'CDLHANGINGMAN',
+    'CDLHARAMI',
+    'CDLHARAMICROSS',
+    'CDLHIGHWAVE',
+    'CDLHIKKAKE',
+    'CDLHIKKAKEMOD',
+    'CDLHOMINGPIGEON',
+    'CDLIDENTICAL3CROWS',
+    'CDLINNECK',
+    'CDLINVERTEDHAMMER',
+    'CDLKICKING',
+    'CDLKICKINGBYLENGTH',
+    'CDLLADDERBOTTOM',
+    'CDLLONGLEGGEDDOJI',
+    'CDLLONGLINE',
+    'CDLMARUBOZU',
+    'CDLMATCHINGLOW',
+    'CDLMATHOLD',
+    'CDLMORNINGDOJISTAR',
+    'CDLMORNINGSTAR',
+    'CDLONNECK',
+    'CDLPIERCING',
+    'CDLRICKSHAWMAN',
+    'CDLRISEFALL3METHODS',
+    'CDLSEPARATINGLINES',
+    'CDLSHOOTINGSTAR',
+    'CDLSHORTLINE',
+    'CDLSPINNINGTOP',
+    'CDLSTALLEDPATTERN',
+    'CDLSTICKSANDWICH',
+    'CDLTAKURI',
+    'CDLTASUKIGAP',
+    'CDLTHRUSTING',
+    'CDLTRISTAR',
+    #'CDLUNIQUE3RIVE',
+    'CDLUPSIDEGAP2CROWS',
+    'CDLXSIDEGAP3METHODS'
+]
+
+
+def get_talib_pattern_matrix(ohlcv, **kwargs):
+    """
+    Evaluate all candlestick patterns into a preallocated int8 matrix.
+    TA-Lib patterns take values in -200, -100, 0, 100, 200 so they are stored divided by 100.
+    :param workers: evaluate patterns on a thread pool of this size
+    :return: matrix of shape (records, patterns) and the pattern names of its columns
+    """
+    # Convert OHLC to contiguous float64 arrays once, instead of once per pattern
+    op, hi, lo, cl = [np.ascontiguousarray(ohlcv[c].values, dtype=np.float64) for c in ['open', 'high', 'low', 'close']]
+    names = [c for c in CANDLE_NAMES if getattr(talib, c, None)]
+    result = np.empty((op.shape[0], len(names)), dtype=np.int8)
+
+    def _fill(j):
+        result[:, j] = getattr(talib, names[j])(op, hi, lo, cl) // 100
+
+    if kwargs.get('workers'):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=kwargs.get('workers')) as executor:
+            list(executor.map(_fill, range(len(names))))
+    else:
+        for j in range(len(names)):
+            _fill(j)
+    return result, names
+
+def get_talib_patterns(ohlcv, **kwargs):
+    """
+    One column per candlestick pattern.
+    :param sparse: store columns as sparse arrays, most records match no pattern
+    :param workers: evaluate patterns on a thread pool of this size
+    """
+    matrix, names = get_talib_pattern_matrix(ohlcv, workers=kwargs.get('workers'))
+    if kwargs.get('sparse'):
+        return pd.DataFrame({
+            name: pd.arrays.SparseArray(matrix[:, j].astype(np.int32) * 100, fill_value=0)
+            for j, name in enumerate(names)
+        }, index=ohlcv.index)
+    return pd.DataFrame(matrix.astype(np.int32) * 100, index=ohlcv.index, columns=names)
+
+def get_talib_pattern_aggregates(ohlcv, **kwargs):
+    """
+    Mean and sum of all candlestick patterns, without materializing a column per pattern.
+    :return: mean and sum arrays
+    """
+    matrix, names = get_talib_pattern_matrix(ohlcv, workers=kwargs.get('workers'))
+    total = matrix.sum(axis=1, dtype=np.int64) * 100
+    return total / len(names), total
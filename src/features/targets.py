@@ -40,4 +40,46 @@ def target_binned_class_kmeans(close : pd.Series, **kwargs):
     values = np.reshape(values, (-1, 1))
     discretizer = KBinsDiscretizer(n_bins=kwargs.get('n_bins',3), strategy='kmeans', encode='ordinal')
     discrete = discretizer.fit_transform(values)
-    return pd.Series(np.reshape(discrete, (-1,)), index=pct_var.index)
\ No newline at end of file
+    return pd.Series(np.reshape(discrete, (-1,)), index=pct_var.index)
+
+def target_pct_matrix(close : pd.Series, periods):
+    """
+    Variation from each record to `period` records ahead, for every period at once.
+    Column j matches target_pct(close, periods=periods[j]).
+    :return: array of shape (records, len(periods))
+    """
+    values = close.fillna(method='ffill').values
+    n = values.shape[0]
+    future = np.full((n, len(periods)), np.nan)
+    for j, p in enumerate(periods):
+        future[:n - p, j] = values[p:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = future / values[:, np.newaxis] - 1
+    return pd.DataFrame(pct).fillna(method='ffill').values
+
+def get_targets(close : pd.Series, periods=(1,), **kwargs):
+    """
+    Price, pct, class, binary and binned class targets for each period (horizon) in one pass:
+    a single matrix of shifted returns is discretized in bulk.
+    :return: dict mapping target names to arrays of shape (records, len(periods))
+    """
+    periods = list(periods)
+    values = close.values
+    n = values.shape[0]
+    price = np.full((n, len(periods)), np.nan)
+    for j, p in enumerate(periods):
+        price[:n - p, j] = values[p:]
+    pct = target_pct_matrix(close, periods)
+    binned = np.where(np.isinf(pct), np.nan, pct)
+    binned = pd.DataFrame(binned).fillna(method='ffill').values
+    result = {
+        'price': pd.DataFrame(price).fillna(method='ffill').values,
+        'pct': pct,
+        'class': to_discrete_double(pct, kwargs.get('threshold_lo', -0.01), kwargs.get('threshold_hi', 0.01)),
+        'binary': to_discrete_single(pct, kwargs.get('threshold', 0.00))
+    }
+    for name, n_bins in [('bin_class', 3), ('bin_binary', 2)]:
+        # KBinsDiscretizer fits each column (horizon) independently
+        discretizer = KBinsDiscretizer(n_bins=n_bins, strategy='quantile', encode='ordinal')
+        result[name] = discretizer.fit_transform(binned)
+    return result
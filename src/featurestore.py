@@ -1,13 +1,28 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, MetaData, Table, Column, Index, String, DateTime, select, union, text, insert, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.orm.session import Session
 from config import config
+import numpy as np
+import pandas as pd
+import threading
+import time
 
 engine = None
 Base = declarative_base()
 # Create missing tables
 db_session = None
+_engine_lock = threading.Lock()
+
+class Checkpoint(Base):
+    """High-water mark of a crawled series: timestamp of the last record stored for it"""
+    __tablename__ = 'crawler_checkpoints'
+    source = Column(String(64), primary_key=True)
+    asset = Column(String(64), primary_key=True)
+    metric = Column(String(255), primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+    updated = Column(DateTime, nullable=False)
+
 
 def get_engine_uri():
     return config['database']['sql']['uri'].get(str)
@@ -20,38 +35,302 @@ def init_engine(**kwargs):
     return engine
 
 
-def save_df(storename: str, store):
-    engine = init_engine()
-    with engine.connect() as conn:
-        store.to_sql(name=storename, con=conn, chunksize=config['database']['sql']['chunksize'].get(int), method = 'multi', if_exists='replace')
+def get_engine():
+    # A single pooled engine is shared by the whole process
+    global engine, db_session
+    with _engine_lock:
+        if engine is None:
+            engine = init_engine()
+            db_session = scoped_session(sessionmaker(bind=engine))
+    return engine
+
+
+def get_table(conn, name):
+    return Table(name, MetaData(), autoload_with=conn)
+
+
+def _dedupe_timestamps(conn, name):
+    # Keep the last written record of each timestamp
+    quote = conn.dialect.identifier_preparer.quote
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text('DELETE FROM {0} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {0} GROUP BY timestamp)'.format(quote(name))))
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text('DELETE FROM {0} a USING {0} b WHERE a.timestamp = b.timestamp AND a.ctid < b.ctid'.format(quote(name))))
+
+
+def ensure_index(conn, name):
+    # Upserts are keyed on timestamp, range scans and ORDER BY timestamp rely on this index too.
+    # Stores written by DataFrame.to_sql or by earlier versions have a non unique ix_<name>_timestamp
+    # index, it is replaced once their duplicate timestamps are removed.
+    from sqlalchemy import inspect
+    inspector = inspect(conn)
+    if inspector.get_pk_constraint(name).get('constrained_columns') == ['timestamp']:
+        return
+    indexes = [ix for ix in inspector.get_indexes(name) if ix['column_names'] == ['timestamp']]
+    if any(ix['unique'] for ix in indexes):
+        return
+    table = get_table(conn, name)
+    _dedupe_timestamps(conn, name)
+    for ix in indexes:
+        Index(ix['name'], table.c.timestamp).drop(bind=conn)
+    Index('ux_{}_timestamp'.format(name), table.c.timestamp, unique=True).create(bind=conn)
+
+
+def _ensure_table(conn, name, store):
+    # Create the store from the frame's schema, or add the columns it is missing
+    if not conn.dialect.has_table(conn, name):
+        store.iloc[:0].reset_index().to_sql(name=name, con=conn, index=False)
+        ensure_index(conn, name)
+        return get_table(conn, name)
+    ensure_index(conn, name)
+    table = get_table(conn, name)
+    missing = [c for c in store.columns if c not in table.c]
+    if missing:
+        quote = conn.dialect.identifier_preparer.quote
+        for c in missing:
+            conn.execute(text('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                quote(name), quote(c), Float().compile(dialect=conn.dialect))))
+        table = get_table(conn, name)
+    return table
+
+
+def _to_records(store):
+    df = store.reset_index()
+    df = df.astype(object).where(pd.notna(df), None)
+    return df.to_dict('records')
+
+
+def _upsert_statement(conn, table, columns):
+    if conn.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.timestamp],
+        set_={c: stmt.excluded[c] for c in columns}
+    )
+
+
+def save_df(storename: str, store, mode='upsert', **kwargs):
+    """
+    Write a timestamp indexed frame to a store.
+    :param mode: 'upsert' inserts new records and updates existing ones,
+        'append' only inserts records newer than the store's last one,
+        'replace' drops the store and writes the frame.
+    :param batchsize: records written by each executemany, defaults to database.sql.batchsize
+    :return: number of records written
+    """
+    if store.index.name != 'timestamp':
+        store = store.rename_axis('timestamp')
+    begin = time.perf_counter()
+    batchsize = kwargs.get('batchsize') or config['database']['sql']['batchsize'].get(int)
+    with get_engine().begin() as conn:
+        if mode == 'replace':
+            Table(storename, MetaData()).drop(bind=conn, checkfirst=True)
+        table = _ensure_table(conn, storename, store)
+        if mode == 'append':
+            last = conn.execute(select(table.c.timestamp).order_by(table.c.timestamp.desc()).limit(1)).scalar()
+            if last is not None:
+                store = store.loc[store.index > pd.Timestamp(last)]
+            stmt = insert(table)
+        elif mode in ['upsert', 'replace']:
+            stmt = _upsert_statement(conn, table, list(store.columns))
+        else:
+            raise ValueError('Unknown save mode: {}'.format(mode))
+
+        for i in range(0, store.shape[0], batchsize):
+            batch = store.iloc[i:i + batchsize]
+            if stmt is None:
+                # No native upsert for this dialect: replace overlapping records
+                conn.execute(table.delete().where(table.c.timestamp.in_([t.to_pydatetime() for t in batch.index])))
+                conn.execute(insert(table), _to_records(batch))
+            else:
+                conn.execute(stmt, _to_records(batch))
+    elapsed = time.perf_counter() - begin
+    print('Saved {} records to {} in {:.2f}s ({:.0f} records/s)'.format(
+        store.shape[0], storename, elapsed, store.shape[0] / elapsed if elapsed else 0))
+    return store.shape[0]
+
+
+def save_groups(name, groups: dict, mode='upsert', **kwargs):
+    """
+    Store each feature group in its own timestamp keyed table, <name>__<group>, and record
+    which table holds each feature in the <name>__catalog table.
+    :param groups: dict mapping group names to timestamp indexed frames
+    :param mode: see save_df, 'replace' also drops the catalog and the tables of groups not in groups
+    """
+    features = [c for df in groups.values() for c in df.columns]
+    duplicates = set(c for c in features if features.count(c) > 1)
+    if duplicates:
+        raise ValueError('Features found in more than one group: {}'.format(', '.join(sorted(duplicates))))
+    if mode == 'replace':
+        with get_engine().begin() as conn:
+            old = _get_catalog(conn, name) or {}
+            tables = set(old.values()) - set('{}__{}'.format(name, group) for group in groups)
+            for t in sorted(tables) + ['{}__catalog'.format(name)]:
+                Table(t, MetaData()).drop(bind=conn, checkfirst=True)
+    for group, df in groups.items():
+        save_df('{}__{}'.format(name, group), df, mode=mode, **kwargs)
+
+    catalog = Table(
+        '{}__catalog'.format(name), MetaData(),
+        Column('feature', String(255), primary_key=True),
+        Column('group_name', String(255)),
+        Column('table_name', String(255)),
+        Column('position', Float)
+    )
+    with get_engine().begin() as conn:
+        catalog.create(bind=conn, checkfirst=True)
+        offset = conn.execute(select(catalog.c.position).order_by(catalog.c.position.desc()).limit(1)).scalar() or 0
+        known = set(r[0] for r in conn.execute(select(catalog.c.feature)))
+        records = []
+        for group, df in groups.items():
+            for c in df.columns:
+                if c in known:
+                    continue
+                records.append({'feature': c, 'group_name': group, 'table_name': '{}__{}'.format(name, group),
+                                'position': offset + len(records) + 1})
+        if records:
+            conn.execute(insert(catalog), records)
+
+
+def save_grouped_df(name, store, mode='upsert', **kwargs):
+    """Split a frame in the feature groups of an existing partitioned store and save them"""
+    with get_engine().connect() as conn:
+        catalog = _get_catalog(conn, name)
+    if catalog is None:
+        raise ValueError('{} is not partitioned in feature groups'.format(name))
+    unknown = [c for c in store.columns if c not in catalog]
+    if unknown:
+        raise ValueError('Features not found in {}: {}'.format(name, ', '.join(unknown)))
+    prefix = len(name) + 2
+    tables = list(dict.fromkeys(catalog[c] for c in store.columns))
+    groups = {t[prefix:]: store[[c for c in store.columns if catalog[c] == t]] for t in tables}
+    save_groups(name, groups, mode=mode, **kwargs)
+
+
+def get_checkpoints(source, asset, metrics):
+    """
+    :return: dict of metric: timestamp of the last record stored, None for metrics never crawled
+    """
+    Checkpoint.__table__.create(bind=get_engine(), checkfirst=True)
+    with Session(get_engine()) as session:
+        rows = session.query(Checkpoint).filter(
+            Checkpoint.source == source, Checkpoint.asset == asset, Checkpoint.metric.in_(metrics))
+        stored = {cp.metric: pd.Timestamp(cp.timestamp) for cp in rows}
+    return {m: stored.get(m) for m in metrics}
 
 
-def load_df(name, features, begin=None, end=None):
-    columns = ['timestamp']
+def set_checkpoints(source, asset, metrics, timestamp):
+    """
+    Move the checkpoints of metrics forward to timestamp, once the records up to it are stored.
+    Checkpoints never move backwards.
+    """
+    Checkpoint.__table__.create(bind=get_engine(), checkfirst=True)
+    timestamp = pd.Timestamp(timestamp).to_pydatetime()
+    now = pd.Timestamp.utcnow().tz_convert(None).to_pydatetime()
+    with Session(get_engine()) as session:
+        for m in metrics:
+            cp = session.get(Checkpoint, (source, asset, m))
+            if cp is None:
+                session.add(Checkpoint(source=source, asset=asset, metric=m, timestamp=timestamp, updated=now))
+            elif cp.timestamp < timestamp:
+                cp.timestamp = timestamp
+                cp.updated = now
+        session.commit()
+
+
+def _parse_features(features):
+    if not features:
+        return None
     if type(features) is list:
-         columns += features
-    elif type(features) is str:
-        columns += [features if not ',' in features else features.split(',')]
-    elif not features:
-        columns = ['*']
+        return features
+    if type(features) is str:
+        return features.split(',')
+    raise ValueError('Features must either be a list or a comma-separed string')
+
+
+def _get_catalog(conn, name):
+    # Feature to group table mapping of a partitioned store, None for single table stores
+    catalog_name = '{}__catalog'.format(name)
+    if not conn.dialect.has_table(conn, catalog_name):
+        return None
+    catalog = get_table(conn, catalog_name)
+    rows = conn.execute(select(catalog.c.feature, catalog.c.table_name).order_by(catalog.c.position))
+    return {r[0]: r[1] for r in rows}
+
+
+def _where_range(query, column, begin, end):
+    if begin is not None:
+        query = query.where(column >= pd.Timestamp(begin).to_pydatetime())
+    if end is not None:
+        query = query.where(column <= pd.Timestamp(end).to_pydatetime())
+    return query
+
+
+def _build_query(conn, name, features, begin, end):
+    catalog = _get_catalog(conn, name)
+    if catalog is None:
+        tables = {name: get_table(conn, name)}
+        catalog = {c.name: name for c in tables[name].columns if c.name != 'timestamp'}
     else:
-        raise ValueError('Features must either be a list or a comma-separed string')
+        tables = {}
+    if features is None:
+        features = list(catalog.keys())
+    missing = [f for f in features if f not in catalog]
+    if missing:
+        raise ValueError('Features not found in {}: {}'.format(name, ', '.join(missing)))
+    # Only the groups holding requested features are read
+    for f in features:
+        if catalog[f] not in tables:
+            tables[catalog[f]] = get_table(conn, catalog[f])
+    columns = [tables[catalog[f]].c[f] for f in features]
 
-    engine = init_engine()
-    with engine.connect() as conn:
-        import pandas as pd
-        query = 'SELECT {columns} FROM {name}'.format(columns=','.join(columns), name=name)
-        if begin or end:
-            query += ' WHERE '
-            if begin and end:
-                query += 'timestamp >= {begin} AND timestamp <= {end}'.format(begin=begin, end=end)
-            if begin and not end:
-                query += 'timestamp >= {begin}'.format(begin=begin)
-            if not begin and end:
-                query += 'timestamp <= {end}'.format(end=end)
-        query += ' ORDER BY timestamp ASC'
+    if len(tables) == 1:
+        table = list(tables.values())[0]
+        query = _where_range(select(table.c.timestamp, *columns), table.c.timestamp, begin, end)
+        return query.order_by(table.c.timestamp), features
+    # Align groups on the union of their timestamps, each range filter uses the group's index
+    ts = union(*[_where_range(select(t.c.timestamp), t.c.timestamp, begin, end) for t in tables.values()]).subquery('ts')
+    joined = ts
+    for t in tables.values():
+        joined = joined.outerjoin(t, t.c.timestamp == ts.c.timestamp)
+    query = select(ts.c.timestamp, *columns).select_from(joined).order_by(ts.c.timestamp)
+    return query, features
 
-        return pd.read_sql_query(query, con=conn, chunksize=config['database']['sql']['chunksize'].get(int), parse_dates=True, index_col='timestamp')
 
+def read_batches(name, features=None, begin=None, end=None, **kwargs):
+    """
+    Stream records of a store in timestamp order, holding at most `chunksize` records at a time.
+    Timestamp range and feature projection are part of the query, values are bound parameters.
+    Stores partitioned in feature groups (see save_groups) only join the groups holding requested features.
+    :param features: list or comma-separated string of features, all features when empty
+    :param begin: first timestamp to read (inclusive)
+    :param end: last timestamp to read (inclusive)
+    :param chunksize: records per batch, defaults to database.sql.read_chunksize
+    :param as_array: yield (timestamps, values) ndarray tuples instead of DataFrames
+    """
+    features = _parse_features(features)
+    chunksize = kwargs.get('chunksize') or config['database']['sql']['read_chunksize'].get(int)
+    with get_engine().connect() as conn:
+        query, features = _build_query(conn, name, features, begin, end)
+        result = conn.execution_options(stream_results=True).execute(query)
+        for rows in result.partitions(chunksize):
+            if kwargs.get('as_array'):
+                timestamps = pd.to_datetime([r[0] for r in rows]).values
+                values = np.array([r[1:] for r in rows], dtype=np.float64)
+                yield timestamps, values
+                continue
+            batch = pd.DataFrame.from_records(rows, columns=['timestamp'] + features, coerce_float=True)
+            batch['timestamp'] = pd.to_datetime(batch['timestamp'])
+            yield batch.set_index('timestamp').astype(np.float64)
 
 
+def load_df(name, features, begin=None, end=None, **kwargs):
+    batches = list(read_batches(name, features, begin=begin, end=end, **kwargs))
+    if not batches:
+        return pd.DataFrame(columns=_parse_features(features)).rename_axis('timestamp')
+    return pd.concat(batches)
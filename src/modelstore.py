@@ -0,0 +1,153 @@
+import os
+import yaml
+import threading
+import numpy as np
+
+# On-disk format for fitted selection pipelines (scaler, imputer, XGBClassifier): a directory
+# holding the classifier in xgboost's native format, the fitted arrays of the preprocessing steps
+# in a single npz file and manifest.yaml describing the steps. Unlike a pickle, artifacts don't
+# depend on the scikit-learn version and load without deserializing python objects.
+MANIFEST_FILE = 'manifest.yaml'
+ARRAYS_FILE = 'arrays.npz'
+MODEL_FILE = 'model.ubj'
+
+# Fitted attributes of each supported preprocessing step, the parameters are stored in the manifest
+_STEP_ARRAYS = {
+    'StandardScaler': ['mean_', 'var_', 'scale_', 'n_samples_seen_'],
+    'SimpleImputer': ['statistics_'],
+}
+
+
+def exists(path):
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def get_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE), 'r') as f:
+        return yaml.safe_load(f)
+
+
+def _save_manifest(path, manifest):
+    tmp = os.path.join(path, MANIFEST_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        yaml.safe_dump(manifest, f, sort_keys=False)
+    os.replace(tmp, os.path.join(path, MANIFEST_FILE))
+
+
+def _step_params(step):
+    # Only plain parameters are stored, eg. missing_values=np.nan is restored from the defaults
+    return {k: v for k, v in step.get_params().items() if v is None or isinstance(v, (bool, int, float, str))
+            and not (isinstance(v, float) and np.isnan(v))}
+
+
+def save_pipeline(path, pipeline, **kwargs):
+    """
+    Write a fitted pipeline to path, replacing any previous content.
+    :param kwargs: further values stored in the manifest, eg. the dataset and training range
+    """
+    import sklearn
+    import xgboost
+    *steps, (clf_name, clf) = pipeline.steps
+    os.makedirs(path, exist_ok=True)
+    arrays = {}
+    manifest_steps = []
+    for name, step in steps:
+        kind = type(step).__name__
+        if kind not in _STEP_ARRAYS:
+            raise ValueError('Unsupported pipeline step {}: {}'.format(name, kind))
+        stored = []
+        for attr in _STEP_ARRAYS[kind]:
+            value = getattr(step, attr, None)
+            if value is not None:
+                arrays['{}.{}'.format(name, attr)] = np.asarray(value)
+                stored.append(attr)
+        manifest_steps.append({'name': name, 'type': kind, 'params': _step_params(step), 'arrays': stored})
+    np.savez(os.path.join(path, ARRAYS_FILE), **arrays)
+    clf.save_model(os.path.join(path, MODEL_FILE))
+    features = getattr(pipeline, 'feature_names_in_', None)
+    _save_manifest(path, {
+        'steps': manifest_steps,
+        'classifier': {'name': clf_name, 'type': type(clf).__name__, 'file': MODEL_FILE},
+        'n_features': int(pipeline.n_features_in_),
+        'features': [str(f) for f in features] if features is not None else None,
+        'versions': {'xgboost': xgboost.__version__, 'scikit-learn': sklearn.__version__},
+        **kwargs
+    })
+
+
+class ModelArtifact:
+    """
+    Pipeline loaded from an artifact: the preprocessing steps are applied with numpy from their stored
+    arrays, as the fitted scikit-learn steps would, and the classifier is the native xgboost model.
+    """
+    def __init__(self, manifest, arrays, clf):
+        self.manifest = manifest
+        self.arrays = arrays
+        self.clf = clf
+        self.features = manifest['features']
+
+    def transform(self, X):
+        if self.features is not None and hasattr(X, 'columns'):
+            X = X[self.features]  # Raises KeyError for missing features
+        X = np.array(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.manifest['n_features']:
+            raise ValueError('Expected {} features, got shape {}'.format(self.manifest['n_features'], X.shape))
+        for s in self.manifest['steps']:
+            a = {attr: self.arrays['{}.{}'.format(s['name'], attr)] for attr in s['arrays']}
+            if s['type'] == 'StandardScaler':
+                if s['params']['with_mean']:
+                    X -= a['mean_']
+                if s['params']['with_std']:
+                    X /= a['scale_']
+            elif s['type'] == 'SimpleImputer':
+                statistics = a['statistics_']
+                missing = np.isnan(X)
+                X[missing] = np.broadcast_to(statistics, X.shape)[missing]
+                if not s['params'].get('keep_empty_features', False):
+                    # Features with no values at fit time are dropped, as SimpleImputer does
+                    X = X[:, ~np.isnan(statistics)]
+        return X
+
+    def predict(self, X):
+        return self.clf.predict(self.transform(X))
+
+    def predict_proba(self, X):
+        return self.clf.predict_proba(self.transform(X))
+
+    @property
+    def feature_importances_(self):
+        return self.clf.feature_importances_
+
+
+def load_pipeline(path):
+    """
+    Read the pipeline stored in path as a ModelArtifact, ready to predict.
+    """
+    from xgboost import XGBClassifier
+    manifest = get_manifest(path)
+    for s in manifest['steps']:
+        if s['type'] not in _STEP_ARRAYS:
+            raise ValueError('Unsupported pipeline step {}: {}'.format(s['name'], s['type']))
+    with np.load(os.path.join(path, ARRAYS_FILE)) as arrays:
+        arrays = dict(arrays)
+    clf = XGBClassifier()
+    clf.load_model(os.path.join(path, manifest['classifier']['file']))
+    return ModelArtifact(manifest, arrays, clf)
+
+
+# Loaded artifacts by path, with the manifest's mtime they were loaded at
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def get_pipeline(path):
+    """
+    Pipeline stored in path, loaded once for repeated scoring and again when the artifact is replaced.
+    Only the latest version of each path is kept in memory.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(os.path.join(path, MANIFEST_FILE)).st_mtime_ns
+    with _loaded_lock:
+        if path not in _loaded or _loaded[path][0] != mtime:
+            _loaded[path] = (mtime, load_pipeline(path))
+        return _loaded[path][1]
@@ -0,0 +1,182 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+
+def _source_hash(names):
+    # Hash of the source files of modules and packages (recursively), by import name
+    import importlib.util
+    h = hashlib.sha1()
+    for name in names:
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):  # eg. __main__
+            spec = None
+        if spec is None:
+            continue
+        if spec.submodule_search_locations:
+            files = []
+            for location in spec.submodule_search_locations:
+                for root, dirs, filenames in os.walk(location):
+                    dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+                    files += [os.path.join(root, f) for f in sorted(filenames) if f.endswith('.py')]
+        else:
+            files = [spec.origin] if spec.origin and spec.origin.endswith('.py') else []
+        for filename in files:
+            h.update(name.encode())
+            h.update(os.path.basename(filename).encode())
+            with open(filename, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+class DiskCache:
+    """Content-addressed on-disk cache of function results with size-bounded LRU eviction.
+    Keys hash the source of the function's module and of the `sources` packages it calls into,
+    the function's code and its arguments. Sources are hashed when the cache is created, so
+    editing them invalidates entries from the next run on, while code outside the function's
+    module and `sources` is not tracked. Values are pickled (protocol 5, so DataFrames and
+    arrays are stored as raw buffers).
+    Examples
+    --------
+    # >>> cache = DiskCache('../data/cache', max_size=1 << 30)
+    # >>> ta = cache.call(make_ohlcv_ta, ohlcv)
+    # >>> cache.stats()
+    # {'hits': 0, 'misses': 1, 'evictions': 0, 'size': 1402761, 'files': 1}
+    """
+
+    def __init__(self, path, max_size=1 << 30, ignore=('cache', 'workers'), sources=('features', 'util')):
+        self.path = path
+        self.max_size = max_size
+        # Keyword arguments that don't affect the result
+        self.ignore = set(ignore)
+        # Packages called by cached functions, eg. facets call into features and util
+        self.salt = _source_hash(sources)
+        self._module_hashes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _update(self, h, value):
+        import numpy as np
+        import pandas as pd
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            h.update(type(value).__name__.encode())
+            h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+            h.update(repr(list(value.columns) if hasattr(value, 'columns') else value.name).encode())
+            h.update(repr(value.dtypes.tolist() if hasattr(value, 'columns') else value.dtype).encode())
+        elif isinstance(value, np.ndarray):
+            h.update(repr((value.shape, value.dtype.str)).encode())
+            h.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            h.update(b'{')
+            for k in sorted(value, key=str):
+                h.update(repr(k).encode())
+                self._update(h, value[k])
+            h.update(b'}')
+        elif isinstance(value, (list, tuple)):
+            h.update(b'[')
+            for v in value:
+                self._update(h, v)
+            h.update(b']')
+        else:
+            h.update(repr(value).encode())
+
+    def _update_code(self, h, code):
+        # marshal output depends on reference counts, hash the code's parts instead
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            if hasattr(const, 'co_code'):
+                self._update_code(h, const)
+            else:
+                h.update(repr(const).encode())
+
+    def key(self, fun, args, kwargs):
+        h = hashlib.sha1()
+        h.update(self.salt.encode())
+        h.update('{}.{}'.format(fun.__module__, fun.__qualname__).encode())
+        if fun.__module__ not in self._module_hashes:
+            self._module_hashes[fun.__module__] = _source_hash([fun.__module__])
+        h.update(self._module_hashes[fun.__module__].encode())
+        self._update_code(h, fun.__code__)
+        self._update(h, list(args))
+        self._update(h, {k: v for k, v in kwargs.items() if k not in self.ignore})
+        return h.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def get(self, key):
+        """Cached value for key, or None on a miss"""
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        os.utime(filename)  # Mark as recently used
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        # Write to a temporary file first, so concurrent readers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=5)
+        os.replace(tmp, self._filename(key))
+        self.evict()
+
+    def call(self, fun, *args, **kwargs):
+        key = self.key(fun, args, kwargs)
+        value = self.get(key)
+        if value is None:
+            value = fun(*args, **kwargs)
+            self.put(key, value)
+        return value
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.pkl'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_size"""
+        entries = sorted(self._entries())
+        size = sum(e[1] for e in entries)
+        for _, entry_size, name in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, name in self._entries():
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': sum(e[1] for e in entries),
+            'files': len(entries)
+        }
@@ -1,29 +1,43 @@
 import numpy as np
 
 
-def to_discrete_single(values, threshold):
-    def _to_discrete(x, threshold):
-        if np.isnan(x):
-            return -1
-        if x < threshold:
-            return 0
-        return 1
+def _broadcast(values, thresholds):
+    # One result per threshold (set), stacked on a leading axis when thresholds are arrays
+    values = np.asarray(values, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    if thresholds.ndim == 0:
+        return values, thresholds
+    return values[np.newaxis], thresholds.reshape(thresholds.shape + (1,) * values.ndim)
 
-    fun = np.vectorize(_to_discrete)
-    return fun(values, threshold)
 
+def to_discrete_single(values, threshold, dtype=np.int8):
+    """
+    0 for values below threshold, 1 otherwise and -1 for NaN.
+    :param values: array-like of any shape, eg. (records,) or (records, series)
+    :param threshold: a threshold, or an array of thresholds to discretize values against each of them
+    :return: array of values' shape, with a leading axis of the thresholds' shape for arrays of thresholds
+    """
+    values, threshold = _broadcast(values, threshold)
+    result = (values >= threshold).astype(dtype)
+    result[np.broadcast_to(np.isnan(values), result.shape)] = -1
+    return result
 
-def to_discrete_double(values, threshold_lo=0.01, threshold_hi=0.01, classes = None):
+
+def to_discrete_double(values, threshold_lo=0.01, threshold_hi=0.01, classes = None, dtype=np.int8):
+    """
+    classes[0] for values up to threshold_lo, classes[1] between the thresholds, classes[2] from
+    threshold_hi and -1 for NaN.
+    :param values: array-like of any shape, eg. (records,) or (records, series)
+    :param threshold_lo: a threshold, or an array of thresholds paired with threshold_hi
+    :param threshold_hi: a threshold, or an array of thresholds paired with threshold_lo
+    :return: array of values' shape, with a leading axis of the thresholds' shape for arrays of thresholds
+    """
     if not classes:
         classes = [0,1,2]
-    def _to_discrete(x, threshold_lo, threshold_hi):
-        if np.isnan(x):
-            return -1
-        if x <= threshold_lo:
-            return classes[0]
-        elif threshold_lo < x < threshold_hi:
-            return classes[1]
-        else:
-            return classes[2]
-    fun = np.vectorize(_to_discrete)
-    return fun(values, threshold_lo, threshold_hi)
\ No newline at end of file
+    _, threshold_hi = _broadcast(values, threshold_hi)
+    values, threshold_lo = _broadcast(values, threshold_lo)
+    return np.select(
+        [np.isnan(values), values <= threshold_lo, values < threshold_hi],
+        [-1, classes[0], classes[1]],
+        default=classes[2]
+    ).astype(dtype)
@@ -0,0 +1,112 @@
+import numpy as np
+import functools
+
+# Sliding window kernels over 1d arrays. Results are aligned with the input: element i
+# covers the trailing window x[i-window+1:i+1] and the first window-1 elements are NaN.
+# Windows containing a NaN give NaN, as np.min/np.max on the same slice would.
+
+
+def _kernel(fun):
+    # Validates the input and handles windows longer than the series (all NaN)
+    @functools.wraps(fun)
+    def wrapper(x, window):
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim != 1:
+            raise ValueError("Sliding windows need a 1d array, got shape {}".format(x.shape))
+        if window < 1:
+            raise ValueError("Window must be positive, got {}".format(window))
+        if window > x.shape[0]:
+            return np.full(x.shape[0], np.nan)
+        return fun(x, window)
+    return wrapper
+
+
+def _windows_with(mask, window):
+    # Mask of the complete windows containing at least a True element of mask
+    counts = np.concatenate([[0], np.cumsum(mask)])
+    return (counts[window:] - counts[:-window]) > 0
+
+
+def _nan_windows(x, window):
+    return _windows_with(np.isnan(x), window)
+
+
+def _aligned(values, n, window, nan_windows=None):
+    result = np.full(n, np.nan)
+    result[window - 1:] = values
+    if nan_windows is not None and nan_windows.any():
+        result[window - 1:][nan_windows] = np.nan
+    return result
+
+
+def _filter(fun, x, window):
+    # scipy's min/max filters run in O(n) regardless of window (van Herk/Gil-Werman):
+    # the centered window at j = i - window + 1 + window // 2 is the trailing window at i.
+    nan_windows = _nan_windows(x, window)
+    filtered = fun(np.where(np.isnan(x), 0, x), size=window, mode='nearest')
+    start = window // 2
+    return _aligned(filtered[start:start + x.shape[0] - window + 1], x.shape[0], window, nan_windows)
+
+
+@_kernel
+def sliding_max(x, window):
+    from scipy.ndimage import maximum_filter1d
+    return _filter(maximum_filter1d, x, window)
+
+
+@_kernel
+def sliding_min(x, window):
+    from scipy.ndimage import minimum_filter1d
+    return _filter(minimum_filter1d, x, window)
+
+
+@_kernel
+def sliding_sum(x, window):
+    """
+    Running sum from the difference of cumulative sums, precision degrades with the
+    magnitude of the cumulative sum so prefer talib.SUM for long series of large values.
+    """
+    nan_windows = _nan_windows(x, window)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(np.isfinite(x), x, 0))])
+    values = sums[window:] - sums[:-window]
+    # Infinities are counted apart, as inf - inf would spoil every later window
+    pos = _windows_with(x == np.inf, window)
+    neg = _windows_with(x == -np.inf, window)
+    values[pos] = np.inf
+    values[neg] = -np.inf
+    values[pos & neg] = np.nan
+    return _aligned(values, x.shape[0], window, nan_windows)
+
+
+def _since(x, window, latest_max):
+    from scipy.ndimage import maximum_filter1d
+    nan_windows = _nan_windows(x, window)
+    n = x.shape[0]
+    # Dense ranks of the values, as min/max filters need exact integer keys: the key of
+    # element j is rank * n + j, so its maximum is the extreme value, most recent when tied.
+    _, ranks = np.unique(np.where(np.isnan(x), 0, x), return_inverse=True)
+    ranks = ranks.astype(np.int64)
+    if not latest_max:
+        ranks = ranks.max() - ranks
+    keys = ranks * n + np.arange(n, dtype=np.int64)
+    start = window // 2
+    filtered = maximum_filter1d(keys, size=window, mode='nearest')[start:start + n - window + 1]
+    since = np.arange(window - 1, n) - filtered % n
+    return _aligned(since.astype(np.float64), n, window, nan_windows)
+
+
+@_kernel
+def sliding_argmax(x, window):
+    """
+    Periods since the maximum of each window (0 when the last element is the maximum),
+    the most recent one when tied.
+    """
+    return _since(x, window, True)
+
+
+@_kernel
+def sliding_argmin(x, window):
+    """
+    Periods since the minimum of each window, see sliding_argmax.
+    """
+    return _since(x, window, False)
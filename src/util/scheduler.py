@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+def _timed(fun, args, kwargs):
+    begin = time.perf_counter()
+    result = fun(*args, **kwargs)
+    return result, time.perf_counter() - begin
+
+
+def run_facets(facets: dict, inputs: dict, executor='thread', workers=None, cache=None):
+    """
+    Run a DAG of facets, each facet starts as soon as all of its inputs are available.
+    :param facets: dict mapping facet names to (function, [input names], kwargs) tuples, input names
+        refer either to other facets or to keys of `inputs`. The function is called with the inputs as
+        positional arguments, in order.
+    :param inputs: dict of values facets can depend on
+    :param executor: 'thread', 'process' or None to run facets serially in the calling thread
+    :param workers: maximum number of concurrent facets
+    :param cache: optional util.cache.DiskCache, facets found in it are not computed again
+    :return: dict of results (including inputs) and dict of wall times in seconds, keyed by name
+    """
+    for name, (_, deps, _) in facets.items():
+        for d in deps:
+            if d not in facets and d not in inputs:
+                raise ValueError('Facet {} depends on unknown input {}'.format(name, d))
+
+    results = dict(inputs)
+    timings = {}
+    keys = {}
+    pending = dict(facets)
+
+    def _ready():
+        # Pop facets whose inputs are available, resolving the cached ones right away
+        ready = []
+        for name in [n for n, (_, deps, _) in pending.items() if all(d in results for d in deps)]:
+            fun, deps, kwargs = pending.pop(name)
+            args = [results[d] for d in deps]
+            if cache is not None:
+                begin = time.perf_counter()
+                keys[name] = cache.key(fun, args, kwargs)
+                value = cache.get(keys[name])
+                if value is not None:
+                    results[name], timings[name] = value, time.perf_counter() - begin
+                    continue
+            ready.append((name, fun, args, kwargs))
+        return ready
+
+    def _done(name, value, elapsed):
+        results[name], timings[name] = value, elapsed
+        if cache is not None:
+            cache.put(keys[name], value)
+
+    if not executor:
+        while pending:
+            ready = _ready()
+            if not ready and pending and not any(all(d in results for d in deps) for _, deps, _ in pending.values()):
+                raise ValueError('Cyclic dependency between facets: {}'.format(', '.join(pending)))
+            for name, fun, args, kwargs in ready:
+                _done(name, *_timed(fun, args, kwargs))
+        return results, timings
+
+    pool_class = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}.get(executor)
+    if not pool_class:
+        raise ValueError('Unknown executor: {}'.format(executor))
+    with pool_class(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            ready = _ready()
+            for name, fun, args, kwargs in ready:
+                running[pool.submit(_timed, fun, args, kwargs)] = name
+            if not running:
+                if pending and not any(all(d in results for d in deps) for _, deps, _ in pending.values()):
+                    raise ValueError('Cyclic dependency between facets: {}'.format(', '.join(pending)))
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                _done(running.pop(future), *future.result())
+    return results, timings
+
+
+def print_timings(timings: dict, total=None):
+    for name, elapsed in sorted(timings.items(), key=lambda t: t[1], reverse=True):
+        print('{:<24} {:>8.2f}s'.format(name, elapsed))
+    if total is not None:
+        print('{:<24} {:>8.2f}s (sum of facets {:.2f}s)'.format('total', total, sum(timings.values())))
+
+
+def peak_rss():
+    """Peak resident set size of this process in MB, None where the resource module is unavailable"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
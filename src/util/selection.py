@@ -0,0 +1,166 @@
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Feature selection over walk-forward folds: each fold trains on the records preceding its test
+# records, as in sklearn's TimeSeriesSplit. Folds run in a process pool whose workers read the
+# training matrix from shared memory, so it is copied once rather than pickled into every task.
+
+_shared = {}
+
+
+def make_pipeline(**clf_params):
+    """Pipeline used for selection: scaler, imputer and XGBClassifier exposing feature_importances_"""
+    from xgboost import XGBClassifier
+    from util.selection_pipeline import LeanPipeline
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+    return LeanPipeline(steps=[
+        ('s', StandardScaler()),
+        ('i', SimpleImputer()),
+        ('c', XGBClassifier(use_label_encoder=False, **clf_params))
+    ])
+
+
+def _share(a):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+    np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+    return shm, (shm.name, a.shape, a.dtype.str)
+
+
+def _attach(name, shape, dtype):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _init_worker(x, y):
+    # Keep the segments referenced for the worker's lifetime, the arrays are views on them
+    for key, desc in (('x', x), ('y', y)):
+        _shared[key + '_shm'], _shared[key] = _attach(*desc)
+
+
+def _encode(y_train, y_test):
+    # XGBClassifier needs labels 0..n-1 in every training fold, test labels missing from the
+    # training fold are encoded as -1 and never predicted
+    classes, y_train = np.unique(y_train, return_inverse=True)
+    pos = np.minimum(np.searchsorted(classes, y_test), classes.shape[0] - 1)
+    return y_train, np.where(classes[pos] == y_test, pos, -1)
+
+
+def _fold_task(fold, train, test, columns, scoring, n_repeats, clf_params, seed):
+    """
+    Fit the pipeline on one fold's training records and score it on its test records.
+    :param train, test: (begin, end) record ranges of the fold
+    :param columns: indexes of the features the pipeline is fit on
+    :param n_repeats: permutations of each feature on the test records, 0 to skip permutation importance
+    """
+    from sklearn.metrics import get_scorer
+    X, y = _shared['x'], _shared['y']
+    X_train, X_test = X[train[0]:train[1], columns], X[test[0]:test[1], columns]
+    y_train, y_test = _encode(y[train[0]:train[1]], y[test[0]:test[1]])
+    begin = time.perf_counter()
+    pipeline = make_pipeline(n_jobs=1, random_state=seed, **clf_params)
+    pipeline.fit(X_train, y_train)
+    fit_time = time.perf_counter() - begin
+    scorer = get_scorer(scoring)
+    begin = time.perf_counter()
+    score = scorer(pipeline, X_test, y_test)
+    # The imputer drops features without values in the training records, eg. late starting ones in the
+    # early folds: they get no importance, so importances are aligned with columns in every fold
+    importances = np.zeros(len(columns))
+    importances[~np.isnan(pipeline.named_steps['i'].statistics_)] = pipeline.feature_importances_
+    result = {'fold': fold, 'score': float(score), 'importances': importances}
+    if n_repeats:
+        from sklearn.inspection import permutation_importance
+        imp = permutation_importance(pipeline, X_test, y_test, scoring=scoring, n_repeats=n_repeats,
+                                     random_state=seed)
+        result['importances'] = imp.importances_mean
+    result['fit_time'] = fit_time
+    result['score_time'] = time.perf_counter() - begin
+    return result
+
+
+def time_series_folds(n_records, n_splits=5, test_size=None, gap=0):
+    """(train, test) record ranges of walk-forward folds, as in sklearn.model_selection.TimeSeriesSplit"""
+    from sklearn.model_selection import TimeSeriesSplit
+    splits = TimeSeriesSplit(n_splits=n_splits, test_size=test_size, gap=gap).split(np.empty((n_records, 1)))
+    return [((int(train[0]), int(train[-1]) + 1), (int(test[0]), int(test[-1]) + 1)) for train, test in splits]
+
+
+def select_features(X, y, method='rfecv', n_splits=5, step=0.1, min_features=1, scoring='balanced_accuracy',
+                    n_repeats=5, threshold=0.0, workers=None, seed=0, **clf_params):
+    """
+    Select features over walk-forward folds run concurrently in a process pool.
+    'rfecv': recursive elimination, each round fits all folds on the remaining features and drops the
+        `step` least important (mean importance across folds), the round with the best mean test score wins.
+    'permutation': features whose permutation importance on the test records of the folds, averaged
+        over folds less its standard deviation across folds, is above `threshold`.
+    :param X: DataFrame of features, infinite values are treated as missing
+    :param step: features dropped by each elimination round, a fraction of the remaining ones when < 1
+    :param n_repeats: permutations of each feature in a fold ('permutation' only)
+    :param workers: size of the process pool
+    :param clf_params: further XGBClassifier parameters
+    :return: boolean support aligned with X.columns and a report with the score of each round and the
+        timing of each fold
+    """
+    if method not in ('rfecv', 'permutation'):
+        raise ValueError('Unknown selection method: {}'.format(method))
+    values = X.to_numpy(dtype=np.float64)
+    values[np.isinf(values)] = np.nan
+    folds = time_series_folds(values.shape[0], n_splits=n_splits)
+    features = np.arange(values.shape[1])
+    rounds = []
+    timings = []
+    x_shm, x_desc = _share(values)
+    y_shm, y_desc = _share(np.asarray(y))
+    del values
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(x_desc, y_desc)) as executor:
+            while True:
+                begin = time.perf_counter()
+                futures = [executor.submit(_fold_task, i, train, test, features, scoring,
+                                           n_repeats if method == 'permutation' else 0, clf_params, seed)
+                           for i, (train, test) in enumerate(folds)]
+                results = [f.result() for f in futures]
+                importances = np.mean([r['importances'] for r in results], axis=0)
+                score = float(np.mean([r['score'] for r in results]))
+                rounds.append({'features': features, 'score': score, 'importances': importances,
+                               'importances_std': np.std([r['importances'] for r in results], axis=0)})
+                for r in results:
+                    timings.append({'round': len(rounds) - 1, 'fold': r['fold'], 'features': int(features.shape[0]),
+                                    'train': folds[r['fold']][0][1] - folds[r['fold']][0][0],
+                                    'test': folds[r['fold']][1][1] - folds[r['fold']][1][0],
+                                    'score': r['score'], 'fit_time': r['fit_time'], 'score_time': r['score_time']})
+                print('Round {}: {} features, score {:.4f} ({:.1f}s)'.format(
+                    len(rounds) - 1, features.shape[0], score, time.perf_counter() - begin))
+                if method == 'permutation' or features.shape[0] <= min_features:
+                    break
+                drop = int(step * features.shape[0]) if step < 1 else int(step)
+                drop = min(max(drop, 1), features.shape[0] - min_features)
+                # Stable sort, so ties drop the first features in column order
+                features = np.sort(features[np.argsort(importances, kind='stable')[drop:]])
+    finally:
+        for shm in (x_shm, y_shm):
+            shm.close()
+            shm.unlink()
+
+    support = np.zeros(X.shape[1], dtype=bool)
+    if method == 'permutation':
+        # Features that only help in some folds are dropped
+        support[features[rounds[0]['importances'] - rounds[0]['importances_std'] > threshold]] = True
+        best = 0
+    else:
+        # Best mean score, the fewest features when tied
+        best = max(range(len(rounds)), key=lambda i: (rounds[i]['score'], -rounds[i]['features'].shape[0]))
+        support[rounds[best]['features']] = True
+    report = {
+        'method': method,
+        'scoring': scoring,
+        'folds': len(folds),
+        'score': rounds[best]['score'],
+        'rounds': [{'features': int(r['features'].shape[0]), 'score': r['score']} for r in rounds],
+        'timings': timings
+    }
+    return support, report
@@ -21,4 +21,25 @@ class Pipeline(SklearnPipeline):
             self.feature_importances_ = clf.feature_importances_
 
         self.is_fit = True
-        return self
\ No newline at end of file
+        return self
+
+# Same interface as Pipeline, without keeping a reference to the training data: fitted
+# pipelines and their pickles only hold the fitted steps
+class LeanPipeline(SklearnPipeline):
+    @property
+    def is_fit(self):
+        from sklearn.utils.validation import check_is_fitted
+        from sklearn.exceptions import NotFittedError
+        try:
+            check_is_fitted(self.steps[-1][-1])
+        except NotFittedError:
+            return False
+        return True
+
+    @property
+    def coef_(self):
+        return self.steps[-1][-1].coef_
+
+    @property
+    def feature_importances_(self):
+        return self.steps[-1][-1].feature_importances_
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# Modules are imported from src and resolve paths such as ../config.yaml from there, as the cli does
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+os.chdir(SRC)
+
+
+@pytest.fixture
+def store_uri(tmp_path):
+    """Point the featurestore at a scratch sqlite database"""
+    import featurestore
+    from config import config
+    uri = 'sqlite:///{}'.format(tmp_path / 'feature_store.db')
+    config.set({'database': {'sql': {'uri': uri}}})
+    featurestore.engine = None
+    yield uri
+    if featurestore.engine is not None:
+        featurestore.engine.dispose()
+    featurestore.engine = None
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+
+def ohlcv(n=1500, seed=0, start='2015-01-01', freq='D'):
+    """Daily candles from a geometric random walk"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n, freq=freq)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))
+    open_ = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.gamma(2, 1000, n)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def coinmetrics(n=1500, seed=1, start='2014-12-01'):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n + 40, freq='D')
+    return pd.DataFrame({'AdrActCnt': rng.gamma(2, 1e5, n + 40), 'TxCnt': rng.gamma(3, 1e5, n + 40)}, index=index)
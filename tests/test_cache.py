@@ -0,0 +1,69 @@
+import importlib
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from util.cache import DiskCache
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """Scratch modules: facet.run calls into helpers.scale"""
+    (tmp_path / 'facet.py').write_text('from helpers import scale\n\ndef run(df):\n    return scale(df)\n')
+    (tmp_path / 'helpers').mkdir()
+    (tmp_path / 'helpers' / '__init__.py').write_text('def scale(df):\n    return df * 2\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    for name in ['facet', 'helpers']:
+        sys.modules.pop(name, None)
+
+
+def _import(name):
+    importlib.invalidate_caches()
+    sys.modules.pop(name, None)
+    return importlib.import_module(name)
+
+
+def test_hits_and_misses(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'), sources=())
+    df = pd.DataFrame({'a': np.arange(10.0)})
+    first = cache.call(pd.DataFrame.cumsum, df)
+    second = cache.call(pd.DataFrame.cumsum, df)
+    pd.testing.assert_frame_equal(first, second)
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.call(pd.DataFrame.cumsum, df + 1)
+    assert cache.misses == 2
+
+
+def test_editing_a_callee_invalidates_entries(package):
+    df = pd.DataFrame({'a': np.arange(10.0)})
+    facet = _import('facet')
+    cache = DiskCache(str(package / 'cache'), sources=('helpers',))
+    pd.testing.assert_frame_equal(cache.call(facet.run, df), df * 2)
+
+    (package / 'helpers' / '__init__.py').write_text('def scale(df):\n    return df * 3\n')
+    _import('helpers')
+    facet = _import('facet')
+    cache = DiskCache(str(package / 'cache'), sources=('helpers',))
+    pd.testing.assert_frame_equal(cache.call(facet.run, df), df * 3)
+    assert cache.misses == 1
+
+
+def test_editing_the_functions_module_invalidates_entries(package):
+    df = pd.DataFrame({'a': np.arange(10.0)})
+    key = DiskCache(str(package / 'cache'), sources=()).key(_import('facet').run, [df], {})
+    # Same function code, a different module constant
+    (package / 'facet.py').write_text('from helpers import scale\nFACTOR = 1\n\ndef run(df):\n    return scale(df)\n')
+    assert DiskCache(str(package / 'cache'), sources=()).key(_import('facet').run, [df], {}) != key
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'), sources=())
+    df = pd.DataFrame({'a': np.arange(1000.0)})
+    cache.call(pd.DataFrame.cumsum, df)
+    entry = cache.stats()['size']
+    cache.max_size = int(entry * 2.5)
+    for i in range(1, 4):
+        cache.call(pd.DataFrame.cumsum, df + i)
+    assert cache.stats()['files'] == 2
+    assert cache.evictions == 2
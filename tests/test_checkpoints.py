@@ -0,0 +1,168 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+import featurestore
+from crawlers import load_api_spec, coinmetrics, kraken
+from crawlers.client import Client
+
+DAYS = pd.date_range('2020-01-01', periods=20, freq='D')
+PAGE_SIZE = 4
+
+
+def _value(metric, day):
+    return int(metric[1:]) * 1000 + day
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Stand-in for the coinmetrics asset metrics and kraken OHLC endpoints over DAYS
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with server.lock:
+            server.hits.append((url.path, query))
+            fail = query.get('page') in server.fail_pages
+            if fail:
+                server.fail_pages.remove(query.get('page'))
+        if fail:
+            return self._send(404, {})
+        if url.path == '/timeseries/asset-metrics':
+            begin = pd.Timestamp(query['start_time']).tz_convert(None)
+            end = pd.Timestamp(query['end_time']).tz_convert(None)
+            days = [i for i, d in enumerate(DAYS[:server.available]) if begin <= d <= end]
+            page = int(query.get('page', 0))
+            payload = {'data': [dict(asset=query['assets'], time=DAYS[i].isoformat() + '.000000000Z',
+                                     **{m: str(_value(m, i)) for m in query['metrics'].split(',')})
+                                for i in days[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]]}
+            if (page + 1) * PAGE_SIZE < len(days):
+                payload['next_page_url'] = 'http://127.0.0.1:{}{}&page={}'.format(
+                    server.server_address[1], self.path.split('&page=')[0], page + 1)
+        else:
+            # Kraken serves records newer than since, the last one is still in progress
+            since = int(query['since'])
+            records = [[int(d.timestamp()), *[str(_value('m1', i) + server.revision)] * 5, '1.5', 10]
+                       for i, d in enumerate(DAYS[:server.available]) if d.timestamp() > since]
+            payload = {'error': [], 'result': {'XXBTZUSD': records, 'last': 0}}
+        self._send(200, payload)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.lock = threading.Lock()
+    server.hits = []
+    server.fail_pages = set()
+    server.available = 10
+    server.revision = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, spec_file):
+    spec = load_api_spec(spec_file)
+    spec['rate_limit'] = {'rate': 1000, 'burst': 1000}
+    return Client(spec, base_url='http://127.0.0.1:{}'.format(server.server_address[1]), retries=0)
+
+
+def _expected(metrics, days):
+    return pd.DataFrame({m: [float(_value(m, i)) for i in range(days)] for m in metrics},
+                        index=pd.DatetimeIndex(DAYS[:days], name='timestamp'))
+
+
+def _starts(server):
+    return [(q['metrics'], q['start_time'][:10]) for path, q in server.hits if 'page' not in q]
+
+
+def _crawl(server, metrics, end):
+    client = _client(server, 'crawlers/coinmetrics-community.yaml')
+    return coinmetrics.crawl_asset_metrics('btc', metrics, '1d', '2020-01-01', end=end, storename='cm', client=client)
+
+
+def test_crawl_resumes_from_checkpoints(store_uri, server):
+    assert _crawl(server, ['m1', 'm2'], '2020-01-10') == 10
+    assert len(server.hits) == 3  # Pages of 4 records
+    pd.testing.assert_frame_equal(featurestore.load_df('cm', ['m1', 'm2']), _expected(['m1', 'm2'], 10),
+                                  check_freq=False)
+    assert featurestore.get_checkpoints('coinmetrics', 'btc', ['m1', 'm2', 'm3']) == \
+        {'m1': DAYS[9], 'm2': DAYS[9], 'm3': None}
+
+    # A refresh fetches again the checkpoint's record and the new ones
+    server.available = 15
+    server.hits.clear()
+    assert _crawl(server, 'm1,m2', '2020-01-15') == 6
+    assert _starts(server) == [('m1,m2', '2020-01-10')]
+    pd.testing.assert_frame_equal(featurestore.load_df('cm', ['m1', 'm2']), _expected(['m1', 'm2'], 15),
+                                  check_freq=False)
+
+
+def test_crawl_backfills_new_metrics(store_uri, server):
+    server.available = 15
+    _crawl(server, ['m1', 'm2'], '2020-01-10')
+    server.hits.clear()
+    # Metrics are grouped by checkpoint, the new metric is fetched from begin
+    _crawl(server, ['m1', 'm3', 'm2'], '2020-01-15')
+    assert _starts(server) == [('m3', '2020-01-01'), ('m1,m2', '2020-01-10')]
+    pd.testing.assert_frame_equal(featurestore.load_df('cm', ['m1', 'm2', 'm3']),
+                                  _expected(['m1', 'm2', 'm3'], 15), check_freq=False)
+    assert set(featurestore.get_checkpoints('coinmetrics', 'btc', ['m1', 'm2', 'm3']).values()) == {DAYS[14]}
+
+
+def test_interrupted_crawl_resumes_from_last_stored_page(store_uri, server):
+    server.fail_pages.add('2')
+    with pytest.raises(requests.HTTPError):
+        _crawl(server, ['m1'], '2020-01-10')
+    # Two pages were stored before the failure
+    assert featurestore.get_checkpoints('coinmetrics', 'btc', ['m1'])['m1'] == DAYS[7]
+    assert featurestore.load_df('cm', ['m1']).shape[0] == 8
+    server.hits.clear()
+    assert _crawl(server, ['m1'], '2020-01-10') == 3
+    assert _starts(server) == [('m1', '2020-01-08')]
+    pd.testing.assert_frame_equal(featurestore.load_df('cm', ['m1']), _expected(['m1'], 10), check_freq=False)
+
+
+def test_checkpoints_never_move_backwards(store_uri, server):
+    featurestore.set_checkpoints('coinmetrics', 'btc', ['m1'], DAYS[5])
+    featurestore.set_checkpoints('coinmetrics', 'btc', ['m1', 'm2'], DAYS[2])
+    assert featurestore.get_checkpoints('coinmetrics', 'btc', ['m1', 'm2']) == {'m1': DAYS[5], 'm2': DAYS[2]}
+
+    _crawl(server, ['m1'], '2020-01-10')
+    # A crawl ending before the checkpoint fetches nothing and keeps it
+    server.hits.clear()
+    assert _crawl(server, ['m1'], '2020-01-03') == 0
+    assert server.hits == []
+    assert featurestore.get_checkpoints('coinmetrics', 'btc', ['m1'])['m1'] == DAYS[9]
+
+
+def test_kraken_crawl_refetches_checkpoint(store_uri, server):
+    client = _client(server, 'crawlers/kraken.yaml')
+    assert kraken.crawl_pair_ohlc('XBTUSD', storename='kr', client=client) == 10
+    assert featurestore.get_checkpoints('kraken', 'XBTUSD', ['ohlc_1440'])['ohlc_1440'] == DAYS[9]
+
+    # The last record was in progress: it's fetched again with the new ones and updated
+    server.available = 12
+    server.revision = 1
+    server.hits.clear()
+    assert kraken.crawl_pair_ohlc('XBTUSD', storename='kr', client=client) == 3
+    assert server.hits[0][1]['since'] == str(int(DAYS[9].timestamp()) - 1)
+    close = featurestore.load_df('kr', ['close'])['close']
+    np.testing.assert_array_equal(close.to_numpy(), [_value('m1', i) + (i >= 9) for i in range(12)])
+    assert featurestore.get_checkpoints('kraken', 'XBTUSD', ['ohlc_1440'])['ohlc_1440'] == DAYS[11]
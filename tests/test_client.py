@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from crawlers import Spec
+from crawlers.client import Client, TokenBucket
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so that a pooled session reuses its connection
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append(self.path)
+            server.ports.add(self.client_address[1])
+            failures = server.failures.get(self.path, [])
+            status = failures.pop(0) if failures else 200
+        payload = {'path': self.path}
+        if self.path.startswith('/pages/'):
+            # Three pages linked by next_page_url
+            page = int(self.path.split('/')[-1])
+            payload = {'data': [page]}
+            if page < 3:
+                payload['next_page_url'] = 'http://127.0.0.1:{}/pages/{}'.format(server.server_address[1], page + 1)
+        body = json.dumps(payload).encode() if status == 200 else b'{}'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0.3')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.lock = threading.Lock()
+    server.hits = []
+    server.ports = set()
+    server.failures = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, rate=1000, burst=1000, **kwargs):
+    spec = Spec(base_url='http://127.0.0.1:{}'.format(server.server_address[1]),
+                endpoints={'item': '/item/{id}'}, rate_limit={'rate': rate, 'burst': burst})
+    return Client(spec, **kwargs)
+
+
+def test_token_bucket_paces_requests(server):
+    client = _client(server, rate=20, burst=2)
+    begin = time.perf_counter()
+    for i in range(8):
+        assert client.get_json(client.url('item', id=i)) == {'path': '/item/{}'.format(i)}
+    # Two requests from the burst, then one every 1/20s
+    assert time.perf_counter() - begin >= (8 - 2) / 20 * 0.95
+
+
+def test_token_bucket_is_shared_by_threads():
+    bucket = TokenBucket(rate=50, burst=5)
+    begin = time.perf_counter()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.perf_counter() - begin >= (20 - 5) / 50 * 0.95
+
+
+def test_retries_server_errors(server):
+    server.failures['/item/1'] = [503, 500]
+    client = _client(server, backoff=0.01)
+    assert client.get_json(client.url('item', id=1)) == {'path': '/item/1'}
+    assert client.retried == 2
+    assert client.requests == 3
+
+
+def test_honours_retry_after(server):
+    server.failures['/item/1'] = [429]
+    client = _client(server, backoff=0.01)
+    begin = time.perf_counter()
+    client.get_json(client.url('item', id=1))
+    assert time.perf_counter() - begin >= 0.3
+
+
+def test_gives_up_after_retries(server):
+    server.failures['/item/1'] = [503] * 3
+    client = _client(server, retries=2, backoff=0.01)
+    with pytest.raises(requests.HTTPError):
+        client.get_json(client.url('item', id=1))
+    assert client.requests == 3
+
+
+def test_client_errors_are_not_retried(server):
+    server.failures['/item/1'] = [404]
+    client = _client(server)
+    with pytest.raises(requests.HTTPError):
+        client.get_json(client.url('item', id=1))
+    assert client.retried == 0
+
+
+def test_session_reuses_connections(server):
+    client = _client(server, pool_size=4)
+    results = client.map(lambda i: client.get_json(client.url('item', id=i)), range(40), workers=4)
+    assert results == [{'path': '/item/{}'.format(i)} for i in range(40)]
+    # At most one connection per worker thread
+    assert len(server.ports) <= 4
+
+
+def test_get_pages(server):
+    client = _client(server)
+    pages = client.get_pages('http://127.0.0.1:{}/pages/1'.format(server.server_address[1]))
+    assert [p['data'] for p in pages] == [[1], [2], [3]]
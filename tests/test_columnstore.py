@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import columnstore
+
+
+def _frame(n=100, start='2021-01-01', columns=('a', 'b', 'c'), seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n, freq='1D', name='timestamp')
+    df = pd.DataFrame(rng.normal(size=(n, len(columns))), index=index, columns=list(columns))
+    df.iloc[::9, 0] = np.nan
+    return df
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    assert not columnstore.exists(path)
+    df = _frame()
+    df['label'] = np.arange(df.shape[0])
+    columnstore.save_columns(path, df)
+    assert columnstore.exists(path)
+    pd.testing.assert_frame_equal(columnstore.load_columns(path), df, check_freq=False)
+    np.testing.assert_array_equal(columnstore.get_column(path, 'b'), df['b'].to_numpy())
+
+
+def test_projection_and_ranges(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    df = _frame()
+    columnstore.save_columns(path, df)
+    pd.testing.assert_frame_equal(columnstore.load_columns(path, columns=['c', 'a']), df[['c', 'a']],
+                                  check_freq=False)
+    ranged = columnstore.load_columns(path, begin='2021-01-10', end='2021-01-20')
+    pd.testing.assert_frame_equal(ranged, df.loc['2021-01-10':'2021-01-20'], check_freq=False)
+    tail = columnstore.load_columns(path, end='2021-01-20', tail=5)
+    pd.testing.assert_frame_equal(tail, df.loc[:'2021-01-20'].iloc[-5:], check_freq=False)
+    assert columnstore.load_columns(path, tail=1).index[0] == df.index[-1]
+    assert columnstore.load_columns(path, begin='2030-01-01').empty
+    with pytest.raises(ValueError):
+        columnstore.load_columns(path, columns=['a', 'missing'])
+
+
+def test_float32(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    df = _frame()
+    columnstore.save_columns(path, df, dtype='float32')
+    loaded = columnstore.load_columns(path)
+    assert (loaded.dtypes == np.float32).all()
+    pd.testing.assert_frame_equal(loaded, df.astype(np.float32), check_freq=False)
+    assert os.path.getsize(os.path.join(path, 'c00000.bin')) == df.shape[0] * 4
+
+
+def test_append(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    df = _frame(n=120)
+    columnstore.save_columns(path, df.iloc[:100], dtype='float32')
+    # Missing columns are stored as NaN, extra ones are ignored
+    columnstore.append_columns(path, df.iloc[100:110].drop(columns=['b']).assign(extra=1.0))
+    columnstore.append_columns(path, df.iloc[110:])
+    expected = df.astype(np.float32)
+    expected.iloc[100:110, 1] = np.nan
+    pd.testing.assert_frame_equal(columnstore.load_columns(path), expected, check_freq=False)
+
+
+def test_append_after_interrupted_append(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    df = _frame(n=120)
+    columnstore.save_columns(path, df.iloc[:100])
+    # An append interrupted before the schema was updated, after writing some of the files
+    with open(os.path.join(path, 'c00000.bin'), 'ab') as f:
+        f.write(np.ones(7).tobytes())
+    with open(os.path.join(path, 'timestamp.bin'), 'ab') as f:
+        f.write(np.arange(3, dtype=np.int64).tobytes())
+    assert columnstore.get_schema(path)['rows'] == 100
+    columnstore.append_columns(path, df.iloc[100:])
+    pd.testing.assert_frame_equal(columnstore.load_columns(path), df, check_freq=False)
+
+
+def test_save_replaces_wider_content(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    columnstore.save_columns(path, _frame(columns=('a', 'b', 'c', 'd')))
+    df = _frame(n=50, columns=('x', 'y'), seed=1)
+    columnstore.save_columns(path, df)
+    assert sorted(os.listdir(path)) == ['c00000.bin', 'c00001.bin', 'schema.yaml', 'timestamp.bin']
+    pd.testing.assert_frame_equal(columnstore.load_columns(path), df, check_freq=False)
+
+
+def test_export_csv(tmp_path):
+    path = str(tmp_path / 'ds.columns')
+    df = _frame(n=95)
+    columnstore.save_columns(path, df)
+    filename = str(tmp_path / 'ds.csv')
+    columnstore.export_csv(path, filename, chunksize=10)
+    exported = pd.read_csv(filename, index_col='timestamp', parse_dates=True)
+    pd.testing.assert_frame_equal(exported, df, check_freq=False)
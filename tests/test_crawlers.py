@@ -0,0 +1,74 @@
+import time
+import threading
+import types
+import numpy as np
+import pandas as pd
+import crawlers
+from crawlers import coinmetrics
+from util.bunch import Bunch
+
+
+def _frame(begin, periods, columns, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(begin, periods=periods, freq='D', name='timestamp')
+    return pd.DataFrame(rng.normal(size=(periods, len(columns))), index=index, columns=columns)
+
+
+def test_map_concurrent_keeps_order():
+    threads = set()
+
+    def fun(i):
+        threads.add(threading.get_ident())
+        time.sleep(0.05 * (4 - i))  # Later items are ready first
+        return i * 10
+    assert list(crawlers.map_concurrent(fun, range(4))) == [0, 10, 20, 30]
+    assert len(threads) > 1
+    assert list(crawlers.map_concurrent(fun, range(4), workers=1)) == [0, 10, 20, 30]
+    assert list(crawlers.map_concurrent(fun, [])) == []
+
+
+def test_merge_aligned_overlapping_columns():
+    first = _frame('2020-01-01', 10, ['a', 'price'])
+    first.iloc[2:4, 1] = np.nan
+    second = _frame('2020-01-06', 10, ['price', 'b'], seed=1)
+    result = crawlers.merge_aligned([first, second])
+    assert list(result.columns) == ['a', 'price', 'b']
+    assert result.index.is_unique and result.index.is_monotonic_increasing
+    assert result.shape[0] == 15
+    # Shared columns keep the values of the first frame, filled from the following ones
+    expected_price = first['price'].combine_first(second['price'])
+    pd.testing.assert_series_equal(result['price'], expected_price, check_freq=False)
+    assert np.isnan(result.loc['2020-01-03', 'price'])  # Missing from both frames
+    pd.testing.assert_series_equal(result['b'].dropna(), second['b'], check_freq=False)
+    assert crawlers.merge_aligned([]) is None
+
+
+def test_merge_aligned_disjoint_timestamps():
+    first = _frame('2020-03-01', 5, ['a'])
+    second = _frame('2020-01-01', 5, ['a', 'b'], seed=1)
+    result = crawlers.merge_aligned([first, second])
+    assert result.shape == (10, 2)
+    pd.testing.assert_frame_equal(result.iloc[:5], second, check_freq=False)
+    pd.testing.assert_series_equal(result['a'].iloc[5:], first['a'], check_freq=False)
+    assert result['b'].iloc[5:].isna().all()
+
+
+def test_bootstrap_data_merges_group_members(monkeypatch):
+    members = {
+        'btc.csv': _frame('2020-01-01', 10, ['PriceUSD', 'AdrActCnt']),
+        'btc-extra.csv': _frame('2020-01-05', 10, ['PriceUSD', 'HashRate'], seed=1),
+    }
+    calls = []
+
+    def get_df(zip_file, filename):
+        calls.append(filename)
+        return members[filename]
+    monkeypatch.setattr(crawlers, 'bootstrap_index', lambda filename: Bunch(coinmetrics={
+        'transformer': 'coinmetrics.py', 'zipfile': 'coinmetrics.zip', 'name_format': '{symbol}',
+        'groups': {'btc': ['btc-extra']}}))
+    monkeypatch.setattr(crawlers, 'load_transformer',
+                        lambda filename: types.SimpleNamespace(__file__=__file__, get_df=get_df))
+    result = coinmetrics.get_bootstrap_data('BTC', workers=2)
+    assert sorted(calls) == ['btc-extra.csv', 'btc.csv']
+    pd.testing.assert_frame_equal(result, crawlers.merge_aligned(members.values()))
+    assert list(result.columns) == ['PriceUSD', 'AdrActCnt', 'HashRate'] and result.shape[0] == 14
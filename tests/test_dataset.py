@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from dataset import build, build_tail
+from .synthetic import ohlcv, coinmetrics
+
+
+def test_update_equals_full_build():
+    # Default parameters, as stored by the bootstrap command: full STL residuals
+    parameters = {'W': 10, 'spline_window': 30}
+    o, cm = ohlcv(1600), coinmetrics(1600)
+    since = o.index[1550]
+    stored = build(o.loc[:since], cm.loc[:since], **parameters)
+    tail = build_tail(o, cm, since=since, anchor=stored.iloc[-1], **parameters).reindex(columns=stored.columns)
+    full = build(o, cm, **parameters)
+
+    expected = full.loc[full.index > since, stored.columns]
+    assert tail.index.equals(expected.index)
+    for c in ['open_resid', 'close_resid_lag5']:
+        np.testing.assert_array_equal(tail[c].to_numpy(), expected[c].to_numpy())
+    np.testing.assert_allclose(tail.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def test_profile_merges_appended_records():
+    from dataset import profile_features, merge_feature_metadata
+    df = ohlcv(300)
+    df.iloc[:20, 1] = np.nan
+    df.iloc[250:, 2] = np.nan
+    df['empty'] = np.nan
+    meta = profile_features(df)
+    assert meta.loc['high', 'null'] == 20 and meta.loc['high', 'valid'] == 280
+    assert meta.loc['high', 'first'] == df.index[20].isoformat()
+    assert meta.loc['low', 'last'] == df.index[249].isoformat()
+
+    old = profile_features(df.iloc[:200]).rename(columns={'valid': 'distinct'})  # As stored before the rename
+    merged = merge_feature_metadata(old, profile_features(df.iloc[200:]))
+    pd.testing.assert_frame_equal(merged, meta, check_dtype=False)
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+from features.decompose import get_rolling_residuals
+from .synthetic import ohlcv
+
+
+def test_cache_is_pruned_to_the_series_windows():
+    o = ohlcv(120)[['close']]
+    window = 30
+    cache = {}
+    first = get_rolling_residuals(o.iloc[:100], window=window, cache=cache, workers=1)
+    windows = 100 - (2 * 7 + 1) + 1
+    assert len(cache) == windows
+
+    # Records appended and the oldest ones dropped, as when updating from a look-back window
+    tail = o.iloc[20:]
+    result = get_rolling_residuals(tail, window=window, cache=cache, workers=1)
+    assert len(cache) == tail.shape[0] - (2 * 7 + 1) + 1
+    expected = get_rolling_residuals(tail, window=window, workers=1)
+    pd.testing.assert_frame_equal(result, expected)
+    # Windows shared by both series come from the cache
+    common = first.index[first.index >= tail.index[window - 1]]
+    pd.testing.assert_frame_equal(result.loc[common], first.loc[common])
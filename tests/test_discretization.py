@@ -0,0 +1,87 @@
+import time
+import numpy as np
+import pytest
+from util.discretization import to_discrete_single, to_discrete_double
+
+
+# The np.vectorize implementations the kernels replaced
+def _reference_single(values, threshold):
+    def _to_discrete(x, threshold):
+        if np.isnan(x):
+            return -1
+        if x < threshold:
+            return 0
+        return 1
+    return np.vectorize(_to_discrete)(values, threshold)
+
+
+def _reference_double(values, threshold_lo=0.01, threshold_hi=0.01, classes=None):
+    if not classes:
+        classes = [0, 1, 2]
+    def _to_discrete(x, threshold_lo, threshold_hi):
+        if np.isnan(x):
+            return -1
+        if x <= threshold_lo:
+            return classes[0]
+        elif threshold_lo < x < threshold_hi:
+            return classes[1]
+        else:
+            return classes[2]
+    return np.vectorize(_to_discrete)(values, threshold_lo, threshold_hi)
+
+
+def _values(n=100000, seed=0):
+    values = np.random.default_rng(seed).normal(0, 0.02, n)
+    values[::97] = np.nan
+    values[::101] = np.inf
+    values[::103] = -np.inf
+    # Values on the thresholds
+    values[::107] = 0.01
+    values[::109] = -0.01
+    values[::113] = 0.0
+    return values
+
+
+@pytest.mark.parametrize('threshold', [0.0, 0.01, -0.01])
+def test_single_matches_reference(threshold):
+    values = _values()
+    result = to_discrete_single(values, threshold)
+    assert result.dtype == np.int8
+    np.testing.assert_array_equal(result, _reference_single(values, threshold))
+
+
+@pytest.mark.parametrize('lo, hi, classes', [(-0.01, 0.01, None), (0.0, 0.0, None), (-0.01, 0.01, [2, 0, 1])])
+def test_double_matches_reference(lo, hi, classes):
+    values = _values()
+    result = to_discrete_double(values, lo, hi, classes=classes)
+    assert result.dtype == np.int8
+    np.testing.assert_array_equal(result, _reference_double(values, lo, hi, classes=classes))
+
+
+def test_threshold_sets_on_many_series():
+    values = np.stack([_values(seed=s) for s in range(3)], axis=1)
+    lo, hi = np.array([-0.01, -0.02, 0.0]), np.array([0.01, 0.02, 0.0])
+    result = to_discrete_double(values, lo, hi)
+    assert result.shape == (3,) + values.shape
+    for k in range(3):
+        for j in range(values.shape[1]):
+            np.testing.assert_array_equal(result[k, :, j], _reference_double(values[:, j], lo[k], hi[k]))
+    thresholds = np.array([-0.01, 0.0, 0.01])
+    result = to_discrete_single(values, thresholds)
+    for k in range(3):
+        np.testing.assert_array_equal(result[k], _reference_single(values, thresholds[k]))
+
+
+def test_benchmark_1m_records():
+    values = _values(1000000)
+    timings = {}
+    for name, fun in [('single', lambda: to_discrete_single(values, 0.0)),
+                      ('reference_single', lambda: _reference_single(values, 0.0)),
+                      ('double', lambda: to_discrete_double(values, -0.01, 0.01)),
+                      ('reference_double', lambda: _reference_double(values, -0.01, 0.01))]:
+        begin = time.perf_counter()
+        fun()
+        timings[name] = time.perf_counter() - begin
+    print(' '.join('{}: {:.3f}s'.format(k, v) for k, v in timings.items()))
+    assert timings['single'] < timings['reference_single']
+    assert timings['double'] < timings['reference_double']
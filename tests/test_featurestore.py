@@ -0,0 +1,62 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import featurestore
+
+
+def _frame(begin, periods, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(begin, periods=periods, freq='D', name='timestamp')
+    return pd.DataFrame({'a': rng.normal(size=periods), 'b': rng.normal(size=periods)}, index=index)
+
+
+def _indexes(uri, name):
+    with sqlite3.connect(uri[len('sqlite:///'):]) as db:
+        return {r[1]: r[2] for r in db.execute('PRAGMA index_list({})'.format(name))}
+
+
+def test_upsert_into_to_sql_table(store_uri):
+    # Stores written by DataFrame.to_sql have a non unique ix_<name>_timestamp index
+    old = _frame('2020-01-01', 10)
+    duplicated = pd.concat([old, old.iloc[-2:] + 1])
+    duplicated.to_sql('prices', featurestore.get_engine(), if_exists='fail')
+    assert _indexes(store_uri, 'prices') == {'ix_prices_timestamp': 0}
+
+    new = _frame('2020-01-09', 5, seed=1)
+    assert featurestore.save_df('prices', new) == 5
+    assert _indexes(store_uri, 'prices') == {'ux_prices_timestamp': 1}
+
+    expected = pd.concat([old.iloc[:-2], new])
+    result = featurestore.load_df('prices', ['a', 'b'])
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+
+def test_upsert_updates_and_inserts(store_uri):
+    featurestore.save_df('prices', _frame('2020-01-01', 10))
+    new = _frame('2020-01-06', 10, seed=1)
+    featurestore.save_df('prices', new)
+    result = featurestore.load_df('prices', ['a', 'b'])
+    assert result.shape[0] == 15
+    pd.testing.assert_frame_equal(result.iloc[5:], new, check_freq=False)
+
+
+def test_replace_groups_resets_catalog(store_uri):
+    df = _frame('2020-01-01', 10)
+    df['c'] = df['a'] * 2
+    featurestore.save_groups('ds', {'g1': df[['a', 'b']], 'g2': df[['c']]})
+    pd.testing.assert_frame_equal(featurestore.load_df('ds', None), df, check_freq=False)
+
+    new = _frame('2020-02-01', 5, seed=1)
+    featurestore.save_groups('ds', {'g1': new[['a']]}, mode='replace')
+    pd.testing.assert_frame_equal(featurestore.load_df('ds', None), new[['a']], check_freq=False)
+    with featurestore.get_engine().connect() as conn:
+        assert not conn.dialect.has_table(conn, 'ds__g2')
+
+
+def test_read_batches_size(store_uri):
+    df = _frame('2000-01-01', 25000)
+    featurestore.save_df('prices', df)
+    # Reads aren't batched by the chunksize of writes (database.sql.chunksize)
+    assert [b.shape[0] for b in featurestore.read_batches('prices', ['a'])] == [10000, 10000, 5000]
+    assert [b.shape[0] for b in featurestore.read_batches('prices', ['a'], end='2000-01-10', chunksize=4)] == [4, 4, 2]
+    pd.testing.assert_frame_equal(featurestore.load_df('prices', ['a', 'b']), df, check_freq=False)
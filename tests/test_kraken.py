@@ -0,0 +1,78 @@
+import types
+import numpy as np
+import pandas as pd
+import pytest
+from crawlers import kraken
+
+
+def _ticks(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, 40 * 86400, n)) + 1577836800
+    ticks = pd.DataFrame({
+        'price': 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n))),
+        'amount': rng.gamma(2, 1, n)
+    }, index=pd.to_datetime(seconds, unit='s'))
+    # Missing prices, including the first ticks of some bars
+    ticks.iloc[rng.choice(n, n // 20, replace=False), 0] = np.nan
+    ticks.iloc[rng.choice(n, n // 50, replace=False), 1] = np.nan
+    ticks.iloc[:3, 0] = np.nan
+    first_of_day = np.flatnonzero(np.r_[True, np.diff(ticks.index.floor('D').asi8) != 0])
+    ticks.iloc[first_of_day[::3], 0] = np.nan
+    return ticks
+
+
+def _chunks(ticks, size):
+    return [ticks.iloc[i:i + size] for i in range(0, ticks.shape[0], size)]
+
+
+@pytest.mark.parametrize('interval', ['1D', '1h'])
+@pytest.mark.parametrize('chunksize', [777, 100000])
+def test_aggregator_matches_resample(interval, chunksize):
+    ticks = _ticks()
+    aggregator = kraken.OHLCVAggregator(interval)
+    for chunk in _chunks(ticks, chunksize):
+        aggregator.update(chunk.index.asi8, chunk['price'].to_numpy(), chunk['amount'].to_numpy())
+    expected = kraken.ticks_to_ohlcv(ticks, interval)
+    pd.testing.assert_frame_equal(aggregator.result(), expected, check_freq=False, check_names=False)
+
+
+def test_stream_matches_resample():
+    ticks = _ticks()
+    result = kraken.stream_ohlcv(_chunks(ticks, 777), ['1D', '4h'])
+    filled = ticks.fillna(method='ffill')
+    for interval in ['1D', '4h']:
+        expected = kraken.ticks_to_ohlcv(filled, interval)
+        pd.testing.assert_frame_equal(result[interval], expected, check_freq=False, check_names=False)
+
+
+def test_bootstrap_ohlcv_reads_transformer_get_df(monkeypatch, capsys):
+    # Transformers without iter_df are read with their own get_df, whatever their source layout
+    ticks = _ticks()
+    transformer = types.SimpleNamespace(__file__=__file__, get_df=lambda zip_file, filename: ticks)
+    monkeypatch.setattr(kraken, '_bootstrap_source',
+                        lambda symbol, currency: ('trades.zip', 'XBTUSD.csv', transformer, None))
+    result = kraken.get_bootstrap_ohlcv('btc', 'usd', intervals=['1D'])['1D']
+    expected = kraken.ticks_to_ohlcv(ticks.fillna(method='ffill'), '1D')
+    pd.testing.assert_frame_equal(result, expected, check_freq=False, check_names=False)
+    assert 'whole trade history of XBTUSD.csv' in capsys.readouterr().out
+
+
+def test_bootstrap_ohlcv_streams_trades_layout(monkeypatch, tmp_path, capsys):
+    # Raw Kraken trade files are streamed in chunks, without the transformer's get_df
+    import zipfile
+    ticks = _ticks().dropna()
+    zip_file = str(tmp_path / 'trades.zip')
+    with zipfile.ZipFile(zip_file, 'w') as z:
+        z.writestr('XBTUSD.csv', pd.DataFrame({'timestamp': ticks.index.asi8 // 10 ** 9, **ticks})
+                   .to_csv(header=False, index=False))
+
+    def get_df(zip_file, filename):
+        raise AssertionError('The whole trade history was read')
+    transformer = types.SimpleNamespace(__file__=__file__, get_df=get_df)
+    monkeypatch.setattr(kraken, '_bootstrap_source',
+                        lambda symbol, currency: (zip_file, 'XBTUSD.csv', transformer, 'trades'))
+    result = kraken.get_bootstrap_ohlcv('btc', 'usd', intervals=['1D', '1h'], chunksize=1000)
+    for interval in ['1D', '1h']:
+        expected = kraken.ticks_to_ohlcv(ticks, interval)
+        pd.testing.assert_frame_equal(result[interval], expected, check_freq=False, check_names=False)
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,62 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import modelstore
+from util.selection import make_pipeline
+
+
+def _data(n=2000, classes=3, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 8)), columns=['f{}'.format(i) for i in range(8)])
+    X.iloc[::7, 3] = np.nan
+    X['empty'] = np.nan  # Dropped by the imputer
+    y = np.digitize(X['f0'] + X['f1'], [-0.5, 0.5][:classes - 1])
+    return X, y
+
+
+@pytest.mark.parametrize('classes', [2, 3])
+def test_round_trip(tmp_path, classes):
+    X, y = _data(classes=classes)
+    pipeline = make_pipeline(n_estimators=20).fit(X, y)
+    modelstore.save_pipeline(str(tmp_path / 'model'), pipeline, dataset='synthetic')
+    assert sorted(os.listdir(tmp_path / 'model')) == ['arrays.npz', 'manifest.yaml', 'model.ubj']
+    assert modelstore.get_manifest(str(tmp_path / 'model'))['dataset'] == 'synthetic'
+
+    artifact = modelstore.load_pipeline(str(tmp_path / 'model'))
+    np.testing.assert_array_equal(artifact.predict_proba(X), pipeline.predict_proba(X))
+    np.testing.assert_array_equal(artifact.predict(X), pipeline.predict(X))
+    np.testing.assert_array_equal(artifact.feature_importances_, pipeline.feature_importances_)
+    # Columns are matched by name
+    np.testing.assert_array_equal(artifact.predict_proba(X[X.columns[::-1]]), pipeline.predict_proba(X))
+    with pytest.raises(KeyError):
+        artifact.predict(X.drop(columns=['f0']))
+    with pytest.raises(ValueError):
+        artifact.predict(X.to_numpy()[:, :5])
+
+
+def test_lean_pipeline_does_not_retain_training_data():
+    X, y = _data(n=20000)
+    pipeline = make_pipeline(n_estimators=5).fit(X, y)
+    assert pipeline.is_fit
+    assert len(pickle.dumps(pipeline)) < X.to_numpy().nbytes / 10
+    assert pipeline.feature_importances_.shape == (X.shape[1] - 1,)
+
+
+def test_get_pipeline_keeps_latest_version(tmp_path):
+    path = str(tmp_path / 'model')
+    X, y = _data()
+    modelstore.save_pipeline(path, make_pipeline(n_estimators=5).fit(X, y))
+    first = modelstore.get_pipeline(path)
+    assert modelstore.get_pipeline(path) is first
+    loaded = len(modelstore._loaded)
+
+    stat = os.stat(os.path.join(path, modelstore.MANIFEST_FILE))
+    modelstore.save_pipeline(path, make_pipeline(n_estimators=10).fit(X, y))
+    os.utime(os.path.join(path, modelstore.MANIFEST_FILE), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    second = modelstore.get_pipeline(path)
+    assert second is not first
+    # The replaced version is released
+    assert len(modelstore._loaded) == loaded
+    assert modelstore._loaded[os.path.abspath(path)][1] is second
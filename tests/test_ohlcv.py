@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features.ohlcv import ohlcv_resample, ohlcv_rolling
+from .synthetic import ohlcv
+
+
+@pytest.mark.parametrize('gaps', [False, True])
+def test_rolling_matches_resample(gaps):
+    o = ohlcv(1000)
+    if gaps:
+        # Missing records, eg. days without trades
+        o = o.drop(o.index[np.random.default_rng(0).choice(o.shape[0], 50, replace=False)])
+    candles = ohlcv_rolling(o, periods=[3, 7, 30], interval='D')
+    for d in [3, 7, 30]:
+        expected = ohlcv_resample(ohlcv=o, period=d, interval='D')[['open', 'high', 'low', 'close', 'volume']]
+        result = candles[d]
+        if gaps:
+            # Resampling shifted by records rather than intervals misses some of the windows ending
+            # at records and labels others at missing dates: only the candles both have are compared
+            expected = expected[~expected.index.duplicated()]
+            assert result.index.isin(o.index).all()
+            expected = expected.loc[expected.index.isin(result.index)]
+            result = result.loc[expected.index]
+        assert result.index.equals(expected.index)
+        np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+
+def test_single_period():
+    o = ohlcv(200)
+    pd.testing.assert_frame_equal(ohlcv_rolling(o, periods=7), ohlcv_rolling(o, periods=[7])[7])
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from util.rolling import sliding_max, sliding_min, sliding_sum, sliding_argmax, sliding_argmin
+from features import technical_indicators as ti
+
+
+def _brute(x, window, fun):
+    result = np.full(x.shape[0], np.nan)
+    for i in range(window - 1, x.shape[0]):
+        w = x[i + 1 - window:i + 1]
+        if not np.isnan(w).any():
+            result[i] = fun(w)
+    return result
+
+
+def _since_max(w):
+    # Periods since the most recent maximum
+    return w.shape[0] - 1 - np.flatnonzero(w == w.max())[-1]
+
+
+def _since_min(w):
+    return w.shape[0] - 1 - np.flatnonzero(w == w.min())[-1]
+
+
+def _series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    # Rounded, so that windows hold ties
+    x = np.round(rng.normal(size=n), 1)
+    x[rng.choice(n, 10, replace=False)] = np.nan
+    x[rng.choice(n, 5, replace=False)] = np.inf
+    x[rng.choice(n, 5, replace=False)] = -np.inf
+    return x
+
+
+@pytest.mark.parametrize('window', [1, 2, 3, 14, 50, 499, 500, 501])
+@pytest.mark.parametrize('kernel, fun', [
+    (sliding_max, np.max),
+    (sliding_min, np.min),
+    (sliding_sum, np.sum),
+    (sliding_argmax, _since_max),
+    (sliding_argmin, _since_min)
+])
+def test_kernels_match_brute_force(kernel, fun, window):
+    x = _series()
+    with np.errstate(invalid='ignore'):
+        expected = _brute(x, window, fun)
+    result = kernel(x, window)
+    if kernel is sliding_sum:
+        np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-9)
+    else:
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_kernel_errors():
+    with pytest.raises(ValueError):
+        sliding_max(np.zeros((3, 3)), 2)
+    with pytest.raises(ValueError):
+        sliding_max(np.zeros(3), 0)
+
+
+def _ohlc(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.round(100 + np.cumsum(rng.normal(size=n)), 1)
+    high = close + np.round(np.abs(rng.normal(size=n)), 1)
+    low = close - np.round(np.abs(rng.normal(size=n)), 1)
+    return high, low, close
+
+
+def _reference_percent_k_pr(high_data, low_data, close_data, period):
+    # The list comprehension percent_k_pr was rebuilt from
+    from pyti.function_helper import fill_for_noncomputable_vals
+    percent_k = [((close_data[idx] - np.min(low_data[idx + 1 - period:idx + 1])) /
+                  (np.max(high_data[idx + 1 - period:idx + 1]) -
+                   np.min(low_data[idx + 1 - period:idx + 1]))) for idx in range(period - 1, len(close_data))]
+    return fill_for_noncomputable_vals(close_data, percent_k)
+
+
+@pytest.mark.parametrize('period', [5, 14, 50])
+def test_percent_k_pr_matches_reference(period):
+    high, low, close = _ohlc()
+    np.testing.assert_array_equal(ti.percent_k_pr(high, low, close, period),
+                                  _reference_percent_k_pr(high, low, close, period))
+
+
+@pytest.mark.parametrize('period', [5, 14, 50])
+def test_percent_k_matches_pyti(period):
+    from pyti.stochastic import percent_k
+    _, _, close = _ohlc()
+    np.testing.assert_array_equal(ti.percent_k(close, period), percent_k(close, period))
+
+
+@pytest.mark.parametrize('period', [5, 14, 25])
+def test_aroon_matches_pyti(period):
+    from pyti import aroon
+    _, _, close = _ohlc()
+    np.testing.assert_array_equal(ti.aroon_up(close, period), aroon.aroon_up(close, period))
+    np.testing.assert_array_equal(ti.aroon_down(close, period), aroon.aroon_down(close, period))
+    np.testing.assert_array_equal(ti.aroon_oscillator(close, period), aroon.aroon_oscillator(close, period))
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from util.selection import select_features, time_series_folds
+
+
+def _data(n=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 12)), columns=['f{}'.format(i) for i in range(12)])
+    y = np.digitize(X['f0'] + 0.5 * X['f1'] + rng.normal(scale=0.5, size=n), [-0.5, 0.5])
+    # A late starting feature, without values in the training records of the first fold
+    X.iloc[:350, 5] = np.nan
+    X.iloc[::11, 7] = np.inf
+    return X, y
+
+
+def test_folds_walk_forward():
+    folds = time_series_folds(1500, n_splits=4)
+    assert folds[0] == ((0, 300), (300, 600))
+    assert all(train == (0, test[0]) for train, test in folds)
+    assert folds[-1][1][1] == 1500
+
+
+@pytest.mark.parametrize('method', ['rfecv', 'permutation'])
+def test_late_starting_feature_and_workers(method):
+    X, y = _data()
+    kwargs = dict(method=method, n_splits=4, step=0.25, min_features=3, n_repeats=2, n_estimators=10)
+    support, report = select_features(X, y, workers=1, **kwargs)
+    assert support.shape == (12,) and support[0]
+    assert report['folds'] == 4
+    assert len(report['timings']) == 4 * len(report['rounds'])
+    if method == 'rfecv':
+        assert [r['features'] for r in report['rounds']] == [12, 9, 7, 6, 5, 4, 3]
+    # Results don't depend on the size of the pool
+    support2, report2 = select_features(X, y, workers=2, **kwargs)
+    np.testing.assert_array_equal(support2, support)
+    assert report2['rounds'] == report['rounds']